@@ -21,6 +21,13 @@ PROPS = [
     # global controllable properties
     ('aabb', bpy.props.IntProperty(name='AABB', description='AABB scale as defined in Instant NGP', default=4, soft_min=1, soft_max=128) ),
     ('splats', bpy.props.BoolProperty(name='Gaussian Points', description='Whether to export a points3d.ply file for Gaussian Splatting', default=True) ),
+    ('init_point_cloud', bpy.props.BoolProperty(name='Dense Initial Point Cloud', description='Whether to sample the dense initial point cloud (init_pt_cld.npz) directly from the meshes of the first frame', default=False) ),
+    ('init_point_cloud_size', bpy.props.IntProperty(name='Point Cloud Size', description='Number of points sampled for the dense initial point cloud', default=150000, min=1) ),
+    ('compositor_outputs', bpy.props.BoolProperty(name='Masks and Composites', description='Whether to write segmentation masks (seg/) and images composited over black (ims/) from the compositor while rendering, instead of in post-processing', default=False) ),
+    ('binary_metadata', bpy.props.BoolProperty(name='Binary Metadata', description='Whether to also write the metadata as memory-mappable .npy arrays next to meta.json', default=False) ),
+    ('ply_ascii', bpy.props.BoolProperty(name='ASCII PLY', description='Whether to write exported .ply files in ASCII instead of binary little-endian format', default=False) ),
+    ('resume_render', bpy.props.BoolProperty(name='Resume', description='Whether to continue an interrupted render: only missing or corrupt images are rendered and exports whose inputs have not changed since the last saved version of the .blend file are skipped', default=False) ),
+    ('render_workers', bpy.props.IntProperty(name='Render Workers', description='Number of headless Blender processes rendering frames and views in parallel, 1 renders in this Blender instance', default=1, min=1, soft_max=64) ),
     ('save_path', bpy.props.StringProperty(name='Save Path', description='Path to the output directory in which the synthetic dataset will be stored', subtype='DIR_PATH') ),
 
     # global automatic properties
@@ -41,10 +48,15 @@ PROPS = [
     ('final_frame_nr', bpy.props.IntProperty(name='End Frame Number', description='Last frame of the animation to render', default=48, soft_min=1) ),
     ('show_sphere', bpy.props.BoolProperty(name='Preview Sphere', description='Whether to show the training sphere from which random views will be sampled', default=False, update=helper.visualize_sphere) ),
     ('view_selection', bpy.props.EnumProperty(name='View Selection', description='Whether to sample views from the whole sphere, upper hemisphere, or middlesection of the training sphere only', default='mid-section', items=[('full', 'full', '', 0), ('upper', 'upper', '', 1), ('mid-section', 'mid-section', '', 2)])),
+    ('virtual_rig', bpy.props.BoolProperty(name='Single Camera Rig', description='Whether to set up a single camera that is moved through all camera poses while rendering, instead of one camera object and render view per camera (faster set up and depsgraph updates with many cameras)', default=False)),
+    ('legacy_cam_sampling', bpy.props.BoolProperty(name='Legacy Sampling', description='Whether to sample random camera positions with the original per-camera Python generators, to reproduce datasets created with earlier versions of the add-on', default=False)),
     ('cam_distribution', bpy.props.BoolProperty(name='Random per-frame', description='Whether to place cameras in fixed uniformly sampled or random per-frame positions', default=False)),
     ('coordinate_frame', bpy.props.BoolProperty(name='Coordinate Frame Convention', description='Whether to use the NeRF/Blender or OpenCV/COLMAP camera coordinate frame convention', default=True)),
+    ('depsgraph_extrinsics', bpy.props.BoolProperty(name='Depsgraph Extrinsics', description='Whether to read camera extrinsics from the evaluated scene at every frame instead of computing them from the cached camera positions (slower, for verification)', default=False)),
     ('export_meshes_per_frame', bpy.props.BoolProperty(name='Export Meshes Per Frame', description='Whether to export meshes in .ply format at each frame of the animation in addition to just the first frame', default=False)),
+    ('mesh_export_format', bpy.props.EnumProperty(name='Mesh Format', description='Whether to export one .ply file per frame, or the triangle list once per object plus compact per-frame vertex buffers', default='ply', items=[('ply', 'ply', '', 0), ('cached', 'cached', '', 1)])),
     ('track_vertex_trajectories', bpy.props.BoolProperty(name='Track Vertex Trajectories', description='Whether to track and export trajectories of mesh vertices', default=False)),
+    ('trajectory_format', bpy.props.EnumProperty(name='Trajectory Format', description='Whether to export vertex trajectories as a single nested JSON file or as dense per-object .npy arrays with a JSON index', default='json', items=[('json', 'json', '', 0), ('dense', 'dense', '', 1)])),
 
     # Pleno automatic properties
     ('sphere_exists', bpy.props.BoolProperty(name='Sphere Exists', description='Whether the sphere exists', default=False) ),
@@ -60,28 +72,40 @@ CLASSES = [
     render_operator.RenderScene
 ]
 
-# load addon
-def register():
+# load addon (headless: skip the UI handlers that sync the sphere with the panel and initialise the save path)
+def register(headless=False):
     for (prop_name, prop_value) in PROPS:
         setattr(bpy.types.Scene, prop_name, prop_value)
 
     for cls in CLASSES:
         bpy.utils.register_class(cls)
 
+    bpy.app.handlers.render_write.append(helper.organise_rendered_frame)
+    bpy.app.handlers.render_pre.append(helper.render_timing_pre)
+    bpy.app.handlers.render_post.append(helper.render_timing_post)
     bpy.app.handlers.render_complete.append(helper.post_render)
     bpy.app.handlers.render_cancel.append(helper.post_render)
-    bpy.app.handlers.depsgraph_update_post.append(helper.properties_desgraph_upd)
-    bpy.app.handlers.depsgraph_update_post.append(helper.set_init_props)
+    if not headless:
+        bpy.app.handlers.depsgraph_update_post.append(helper.properties_desgraph_upd)
+        bpy.app.handlers.depsgraph_update_post.append(helper.set_init_props)
+        bpy.app.handlers.load_post.append(helper.load_post_handler)
 
 # deregister addon
 def unregister():
     for (prop_name, _) in PROPS:
         delattr(bpy.types.Scene, prop_name)
 
+    bpy.app.handlers.render_write.remove(helper.organise_rendered_frame)
+    bpy.app.handlers.render_pre.remove(helper.render_timing_pre)
+    bpy.app.handlers.render_post.remove(helper.render_timing_post)
     bpy.app.handlers.render_complete.remove(helper.post_render)
     bpy.app.handlers.render_cancel.remove(helper.post_render)
-    bpy.app.handlers.depsgraph_update_post.remove(helper.properties_desgraph_upd)
-    # bpy.app.handlers.depsgraph_update_post.remove(helper.set_init_props)
+    if helper.properties_desgraph_upd in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.remove(helper.properties_desgraph_upd)
+    if helper.set_init_props in bpy.app.handlers.depsgraph_update_post: # removes itself after its first call
+        bpy.app.handlers.depsgraph_update_post.remove(helper.set_init_props)
+    if helper.load_post_handler in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(helper.load_post_handler)
 
     for cls in CLASSES:
         bpy.utils.unregister_class(cls)
@@ -0,0 +1,53 @@
+'''
+Minimal stand-ins for the bpy and mathutils modules, just enough to import the add-on modules under plain CPython.
+Only pure NumPy code paths can be benchmarked with these, anything touching bpy.data or bpy.ops will fail.
+'''
+import sys
+import math
+import types
+import numpy as np
+
+class Euler:
+    '''XYZ Euler rotation, as used for the training sphere rotation.'''
+    def __init__(self, angles=(0.0, 0.0, 0.0), order='XYZ'):
+        self.angles = tuple(angles)
+
+    def to_matrix(self):
+        x, y, z = self.angles
+        rot_x = np.array([[1, 0, 0], [0, math.cos(x), -math.sin(x)], [0, math.sin(x), math.cos(x)]])
+        rot_y = np.array([[math.cos(y), 0, math.sin(y)], [0, 1, 0], [-math.sin(y), 0, math.cos(y)]])
+        rot_z = np.array([[math.cos(z), -math.sin(z), 0], [math.sin(z), math.cos(z), 0], [0, 0, 1]])
+        return Matrix((rot_z @ rot_y @ rot_x).tolist())
+
+class Matrix(list):
+    '''Row-major nested list, converts with np.array like a mathutils.Matrix.'''
+    pass
+
+def persistent(function):
+    return function
+
+def install():
+    '''Register the fake modules in sys.modules, unless the real ones are available (e.g. when running inside Blender).'''
+    if 'bpy' in sys.modules:
+        return
+
+    bpy = types.ModuleType('bpy')
+    bpy.app = types.SimpleNamespace(background=True, binary_path='blender', timers=None)
+    handlers = types.ModuleType('bpy.app.handlers')
+    handlers.persistent = persistent
+    for name in ('depsgraph_update_post', 'render_write', 'render_complete', 'render_cancel', 'render_pre', 'render_post', 'load_post'):
+        setattr(handlers, name, [])
+    bpy.app.handlers = handlers
+    bpy.types = types.SimpleNamespace(Operator=object, Panel=object, Scene=object, Object=object)
+    bpy.props = types.SimpleNamespace(**{name: (lambda **kwargs: None) for name in ('BoolProperty', 'IntProperty', 'FloatProperty', 'FloatVectorProperty', 'StringProperty', 'EnumProperty')})
+    bpy.path = types.SimpleNamespace(abspath=lambda path: path, clean_name=lambda name: name, basename=lambda path: path.split('/')[-1])
+    bpy.data = types.SimpleNamespace(objects={}, is_dirty=False, filepath='')
+
+    mathutils = types.ModuleType('mathutils')
+    mathutils.Euler = Euler
+    mathutils.Matrix = Matrix
+
+    sys.modules['bpy'] = bpy
+    sys.modules['bpy.app'] = bpy.app
+    sys.modules['bpy.app.handlers'] = handlers
+    sys.modules['mathutils'] = mathutils
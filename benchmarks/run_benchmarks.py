@@ -0,0 +1,259 @@
+'''
+Offline benchmarks for the NumPy/PIL heavy parts of the add-on and the post-processing scripts, runnable without Blender:
+    python benchmarks/run_benchmarks.py [--preset small|large] [--only NAME ...] [--update-baseline]
+Every benchmark builds a synthetic input (N cameras x F frames, images of a given size, PLY files with V vertices),
+then records the median wall time over a few repeats and the peak traced memory (tracemalloc) of a separate run.
+Results are compared against baseline.local.json, the exit code is 1 if any benchmark got slower or uses more memory
+than the baseline allows (see --time-tolerance and --memory-tolerance).
+Timings only compare on the same machine, so the baseline is not version controlled: create it with --update-baseline
+(e.g. on the commit you want to compare against). The comparison is skipped if it was recorded on a different machine set-up.
+'''
+import os
+import sys
+import json
+import time
+import types
+import shutil
+import argparse
+import contextlib
+import platform
+import tempfile
+import importlib
+import tracemalloc
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+ADDON_DIR = os.path.dirname(BENCHMARK_DIR)
+BASELINE_FILE = os.path.join(BENCHMARK_DIR, 'baseline.local.json') # git-ignored, see the module description
+
+PRESETS = {
+    'small': {'cameras': 30, 'frames': 48, 'ply_vertices': 100000, 'images': 16, 'image_size': 512},
+    'large': {'cameras': 500, 'frames': 1000, 'ply_vertices': 2000000, 'images': 64, 'image_size': 1024},
+}
+
+def load_modules():
+    '''Import helper and scene_prep_operator from the add-on package and the post-processing script, with the fake bpy.'''
+    sys.path.insert(0, BENCHMARK_DIR)
+    import fake_bpy
+    fake_bpy.install()
+
+    # import the add-on modules without running the package __init__, which registers Blender classes
+    package = types.ModuleType('plenoblendernerf')
+    package.__path__ = [ADDON_DIR]
+    sys.modules['plenoblendernerf'] = package
+    helper = importlib.import_module('plenoblendernerf.helper')
+    scene_prep = importlib.import_module('plenoblendernerf.scene_prep_operator')
+
+    sys.path.insert(0, os.path.join(ADDON_DIR, 'scripts'))
+    post_processing = importlib.import_module('dataset_post_processing')
+    return helper, scene_prep, post_processing
+
+def fake_scene(view_selection='full', legacy=False):
+    return types.SimpleNamespace(seed=0, sphere_radius=4.0, sphere_scale=(1.0, 1.0, 1.0), sphere_rotation=(0.1, 0.2, 0.3),
+                                 sphere_location=(0.0, 0.0, 1.0), view_selection=view_selection, legacy_cam_sampling=legacy)
+
+## synthetic inputs
+
+def write_ply(path, num_vertices, rng):
+    '''Binary PLY with the vertex layout Blender's PLY exporter writes (positions, normals, colours) and one triangle per 3 vertices.'''
+    vertex_dtype = np.dtype([('x', '<f4'), ('y', '<f4'), ('z', '<f4'), ('nx', '<f4'), ('ny', '<f4'), ('nz', '<f4'),
+                             ('red', 'u1'), ('green', 'u1'), ('blue', 'u1'), ('alpha', 'u1')])
+    vertices = np.zeros(num_vertices, dtype=vertex_dtype)
+    for name in ('x', 'y', 'z', 'nx', 'ny', 'nz'):
+        vertices[name] = rng.standard_normal(num_vertices)
+    for name in ('red', 'green', 'blue', 'alpha'):
+        vertices[name] = rng.integers(0, 256, num_vertices)
+    num_faces = num_vertices // 3
+    faces = np.zeros(num_faces, dtype=np.dtype([('count', 'u1'), ('indices', '<i4', 3)]))
+    faces['count'] = 3
+    faces['indices'] = np.arange(num_faces * 3).reshape(-1, 3)
+
+    header = ['ply', 'format binary_little_endian 1.0', f'element vertex {num_vertices}']
+    header += [f'property float {name}' for name in ('x', 'y', 'z', 'nx', 'ny', 'nz')]
+    header += [f'property uchar {name}' for name in ('red', 'green', 'blue', 'alpha')]
+    header += [f'element face {num_faces}', 'property list uchar int vertex_indices', 'end_header']
+    with open(path, 'wb') as f:
+        f.write(('\n'.join(header) + '\n').encode('ascii'))
+        f.write(vertices.tobytes())
+        f.write(faces.tobytes())
+
+def write_meta(dataset_path, num_cameras, num_frames, rng):
+    '''meta.json in the layout written by RenderScene.write_metadata.'''
+    k = [[500, 0, 256], [0, 500, 256], [0, 0, 1]]
+    meta = {
+        'w': 512,
+        'h': 512,
+        'k': np.tile(k, (num_frames, num_cameras, 1, 1)).tolist(),
+        'w2c': rng.standard_normal((num_frames, num_cameras, 4, 4)).tolist(),
+        'fn': [[f"{cam}/{str(frame + 1).zfill(6)}.png" for cam in range(num_cameras)] for frame in range(num_frames)],
+        'cam_id': [list(range(num_cameras)) for _ in range(num_frames)],
+    }
+    with open(os.path.join(dataset_path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+def write_alpha_images(dataset_path, num_images, size, rng):
+    '''RGBA renders with a soft-edged disc in front of a transparent background, spread over 4 camera folders.'''
+    from PIL import Image
+    yy, xx = np.mgrid[:size, :size]
+    distance = np.hypot(xx - size / 2, yy - size / 2) / (size / 3)
+    alpha = (np.clip(1.5 - distance, 0, 1) * 255).astype(np.uint8)
+    for i in range(num_images):
+        rgb = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+        path = os.path.join(dataset_path, 'alpha_ims', str(i % 4), f"{i // 4 + 1:06d}.png")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        Image.fromarray(np.dstack([rgb, alpha]), mode='RGBA').save(path)
+
+## benchmarks, each returns a function that runs the measured code on prepared inputs
+
+def bench_sample_cam_poses(modules, params, workdir):
+    _, scene_prep, _ = modules
+    operator = scene_prep.ScenePrep()
+    scene = fake_scene('mid-section')
+    return lambda: operator.sample_cam_poses(scene, params['cameras'], params['frames'])
+
+def bench_sample_cam_poses_legacy(modules, params, workdir):
+    _, scene_prep, _ = modules
+    operator = scene_prep.ScenePrep()
+    scene = fake_scene('mid-section', legacy=True)
+    return lambda: operator.sample_cam_poses(scene, params['cameras'], params['frames'])
+
+def bench_regular_cam_poses(modules, params, workdir):
+    _, scene_prep, _ = modules
+    operator = scene_prep.ScenePrep()
+    scene = fake_scene('upper')
+    return lambda: operator.regular_cam_poses(scene, params['cameras'] * 100)
+
+def bench_rotate_ply_to_opencv(modules, params, workdir):
+    helper, _, _ = modules
+    source = os.path.join(workdir, 'points3d.ply')
+    write_ply(source, params['ply_vertices'], np.random.default_rng(0))
+    target = os.path.join(workdir, 'points3d_opencv.ply')
+    return lambda: helper.rotate_ply_to_opencv(source, target)
+
+def bench_remove_trailing_zeros(modules, params, workdir):
+    helper, _, _ = modules
+    w2c = np.round(np.random.default_rng(0).standard_normal((params['frames'], params['cameras'], 4, 4)), 1).tolist()
+    return lambda: helper.remove_trailing_zeros(w2c)
+
+def bench_convert_blender_to_opencv(modules, params, workdir):
+    helper, _, _ = modules
+    poses = np.tile(np.eye(4), (params['frames'], params['cameras'], 1, 1))
+    poses[..., :3, 3] = np.random.default_rng(0).standard_normal((params['frames'], params['cameras'], 3))
+    return lambda: helper.convert_blender_to_opencv(poses)
+
+def bench_train_test_split(modules, params, workdir):
+    _, _, post_processing = modules
+    write_meta(workdir, params['cameras'], params['frames'], np.random.default_rng(0))
+    return lambda: post_processing.train_test_split(workdir, test_cameras=[0, 1])
+
+def bench_create_segmentation_masks(modules, params, workdir):
+    _, _, post_processing = modules
+    write_alpha_images(workdir, params['images'], params['image_size'], np.random.default_rng(0))
+    return lambda: post_processing.create_segmentation_masks(workdir)
+
+def bench_bg_composite(modules, params, workdir):
+    _, _, post_processing = modules
+    write_alpha_images(workdir, params['images'], params['image_size'], np.random.default_rng(0))
+    return lambda: post_processing.bg_composite(workdir)
+
+BENCHMARKS = {name[len('bench_'):]: function for name, function in list(globals().items()) if name.startswith('bench_')}
+
+## measurement
+
+def measure(run, repeat):
+    '''Median wall time over repeat runs, then the peak traced memory of one more run (tracing slows the code down).'''
+    seconds = []
+    with contextlib.redirect_stdout(open(os.devnull, 'w')): # keep progress prints of the benchmarked code out of the report
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            seconds.append(time.perf_counter() - start)
+        tracemalloc.start()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {'seconds': float(np.median(seconds)), 'peak_mb': peak / 2**20}
+
+def machine():
+    '''Set-up the timings were recorded on, baselines from other set-ups are not compared against.'''
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(), 'processor': platform.processor(), 'cpus': os.cpu_count()}
+
+def compare(results, baseline, time_tolerance, memory_tolerance, time_slack=0.005):
+    '''
+    Returns a list of regression messages, benchmarks missing from the baseline are reported but do not fail.
+    Slow-downs smaller than time_slack seconds are ignored, sub-millisecond benchmarks are too noisy for a relative tolerance.
+    '''
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            print(f"  {name}: no baseline")
+            continue
+        time_ratio = result['seconds'] / max(reference['seconds'], 1e-9)
+        memory_ratio = result['peak_mb'] / max(reference['peak_mb'], 1e-9)
+        status = 'ok'
+        if time_ratio > 1 + time_tolerance and result['seconds'] - reference['seconds'] > time_slack:
+            regressions.append(f"{name} took {time_ratio:.2f}x the baseline time")
+            status = 'SLOWER'
+        if memory_ratio > 1 + memory_tolerance and result['peak_mb'] - reference['peak_mb'] > 0.5:
+            regressions.append(f"{name} used {memory_ratio:.2f}x the baseline peak memory")
+            status = 'MORE MEMORY' if status == 'ok' else status + ', MORE MEMORY'
+        print(f"  {name}: {time_ratio:.2f}x time, {memory_ratio:.2f}x memory ({status})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the add-on and post-processing code without Blender.')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='small')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='run only these benchmarks')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timed runs, the median is kept')
+    parser.add_argument('--time-tolerance', type=float, default=0.5, help='allowed relative slow-down before failing')
+    parser.add_argument('--memory-tolerance', type=float, default=0.2, help='allowed relative growth of the peak memory before failing')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--update-baseline', action='store_true', help='store the results as the new baseline for this preset')
+    args = parser.parse_args()
+
+    modules = load_modules()
+    params = PRESETS[args.preset]
+    print(f"Preset {args.preset}: {params}")
+
+    results = {}
+    for name in args.only or BENCHMARKS:
+        workdir = tempfile.mkdtemp(prefix=f'pleno_bench_{name}_')
+        try:
+            run = BENCHMARKS[name](modules, params, workdir)
+            results[name] = measure(run, args.repeat)
+        finally:
+            shutil.rmtree(workdir)
+        print(f"{name:32s} {results[name]['seconds'] * 1000:10.1f} ms {results[name]['peak_mb']:10.1f} MB")
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baselines = json.load(f)
+
+    if args.update_baseline:
+        preset_baseline = baselines.setdefault(args.preset, {})
+        preset_baseline.update(results)
+        baselines['_machine'] = machine()
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=4, sort_keys=True)
+        print(f"Baseline for preset {args.preset} written to {args.baseline}")
+        return
+
+    if not baselines.get(args.preset):
+        print(f"No baseline for preset {args.preset} in {args.baseline}, run with --update-baseline to create one")
+        return
+    if baselines.get('_machine') != machine():
+        print(f"Skipping the comparison, {args.baseline} was recorded on a different machine set-up: {baselines.get('_machine')}")
+        print("Run with --update-baseline on this machine to compare against it")
+        return
+
+    print(f"Compared to {args.baseline}:")
+    regressions = compare(results, baselines.get(args.preset, {}), args.time_tolerance, args.memory_tolerance)
+    if regressions:
+        print('Regressions:\n  ' + '\n  '.join(regressions))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
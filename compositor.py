@@ -0,0 +1,26 @@
+'''
+Compositor outputs shared by the add-on and the render workers (render_worker.py runs as a stand-alone script inside
+headless Blender instances, so it cannot import helper.py). The nodes themselves are set up by helper.setup_compositor_outputs.
+'''
+import os
+
+COMPOSITOR_NODES = {'ims': 'PlenoComposite', 'seg': 'PlenoMask'} # output folder: name of its compositor File Output node
+
+def has_compositor_outputs(scene):
+    return scene.use_nodes and scene.node_tree is not None and COMPOSITOR_NODES['ims'] in scene.node_tree.nodes
+
+def move_compositor_outputs(scene, output_path, frame, cam_views):
+    '''
+    Move the images written by the compositor File Output nodes for every (camera number, render view) of a multiview frame,
+    <output_path>/<ims|seg>/<frame><view suffix>.png, into <output_path>/<ims|seg>/<cam>/<frame>.png.
+    The view suffix is the same one Blender adds to the main render output.
+    '''
+    name = os.path.splitext(os.path.basename(scene.render.frame_path(frame=frame)))[0]
+    for cam, view in cam_views:
+        suffix = os.path.splitext(os.path.basename(scene.render.frame_path(frame=frame, view=view)))[0][len(name):]
+        for folder in COMPOSITOR_NODES:
+            current_path = os.path.join(output_path, folder, f"{frame:06d}{suffix}.png")
+            if os.path.exists(current_path):
+                new_path = os.path.join(output_path, folder, str(cam), f"{frame:06d}.png")
+                os.makedirs(os.path.dirname(new_path), exist_ok=True)
+                os.replace(current_path, new_path)
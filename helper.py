@@ -1,13 +1,43 @@
 import bpy
 import os
+import sys
 import math
 import shutil
 import json
+import hashlib
 import datetime
+import time
+import contextlib
+import threading
+import queue
 import numpy as np
 from bpy.app.handlers import persistent
+from . import compositor
 
 SPHERE_NAME = 'PlenoSphere'
+OWNER_KEY = 'plenoblendernerf' # custom property marking the data blocks created by the add-on
+
+def mark_owned(*data_blocks):
+    '''Tag data blocks created by the add-on, so that the scene reset can remove them.'''
+    for data_block in data_blocks:
+        data_block[OWNER_KEY] = True
+
+def owned_data_blocks():
+    '''All objects, cameras and actions created by the add-on (see mark_owned).'''
+    return [data_block for collection in (bpy.data.objects, bpy.data.cameras, bpy.data.actions) for data_block in collection if data_block.get(OWNER_KEY)]
+
+# nesting depth of handlers_suspended, see properties_desgraph_upd
+suspend_depth = 0
+
+@contextlib.contextmanager
+def handlers_suspended():
+    '''Skip the depsgraph handler while the add-on steps through frames itself (exports, rendering).'''
+    global suspend_depth
+    suspend_depth += 1
+    try:
+        yield
+    finally:
+        suspend_depth -= 1
 
 def is_power_of_two(x):
     return math.log2(x).is_integer()
@@ -96,33 +126,96 @@ def get_camera_intrinsics(scene, camera):
     return camera_intr_dict
 
 def get_camera_extrinsics(scene, camera_list):
+    '''
+    Read the camera extrinsics from the evaluated scene, stepping through every frame.
+    This is slow for heavy animated scenes, prefer get_camera_extrinsics_analytic and keep this as a verification fallback.
+    '''
+    poses = CameraPoses(camera_list)
+    sweep_frames(scene, [poses], frames=[scene.first_frame_nr] if scene.cam_distribution else None)
+    return poses.extrinsics
 
-    camera_extrinsics = []
+def get_camera_extrinsics_analytic(scene, camera_list):
+    '''
+    Compute the camera extrinsics in closed form from the camera positions cached during scene preparation,
+    without re-evaluating the scene at every frame.
+    Every camera tracks the PlenoSphere (TRACK_TO constraint, -Z forward, Y up), so its orientation follows from its position alone.
+    Returns an array of shape [num_frames, num_cameras, 4, 4] containing the w2c matrices.
+    '''
+    positions = get_cached_cam_positions(scene) # [repetitions, num_cameras, 3]
+    target = np.array(bpy.data.objects[SPHERE_NAME].matrix_world.translation)
+    scale = np.array(scene.objects[camera_list[0][1]].scale) # all cameras are copies of the same template
 
-    if scene.cam_distribution:
-        # if cameras are static, only one set of extrinsics is needed
-        repetitions = 1
-    else:
-        repetitions = scene.final_frame_nr - scene.first_frame_nr + 1
+    c2w = look_at_poses(positions, target, scale)
+    if scene.coordinate_frame:
+        c2w = convert_blender_to_opencv(c2w) # convert from NeRF/Blender to OpenCV/COLMAP coordinate frame
+    w2c = invert_poses(c2w) #! invert to get the w2c matrix, not the c2w matrix
 
-    for rep in range(repetitions): # iterate over frames
-        bpy.context.scene.frame_set(rep+1) # set the context to the current frame
-        frame_extrinsics = []
+    nr_frames = scene.final_frame_nr - scene.first_frame_nr + 1
+    if w2c.shape[0] == 1:
+        w2c = np.tile(w2c, (nr_frames, 1, 1, 1))
+    return w2c
 
-        for camera in camera_list:
-            name = camera[1]
-            cam_obj = scene.objects[name]
-            cam_data = np.array(cam_obj.matrix_world)
-            if scene.coordinate_frame: 
-                cam_data = convert_blender_to_opencv(cam_data) # convert from NeRF/Blender to OpenCV/COLMAP coordinate frame
-            w2c = np.linalg.inv(cam_data) #! invert to get the w2c matrix, not the c2w matrix
-            frame_extrinsics.append(listify_matrix(w2c))
-        camera_extrinsics.append(frame_extrinsics)
-    
-    if scene.cam_distribution:
-        camera_extrinsics = np.tile(camera_extrinsics, (scene.final_frame_nr - scene.first_frame_nr + 1, 1, 1, 1))
-    
-    return camera_extrinsics
+def get_rig_poses(scene):
+    '''
+    Pose table for the single camera rig: the camera-to-world matrices (Blender convention) of every camera at every sampled
+    repetition, shape [repetitions, num_cameras, 4, 4]. Same poses as tracking cameras would have, see get_camera_extrinsics_analytic.
+    '''
+    positions = get_cached_cam_positions(scene)
+    target = np.array(bpy.data.objects[SPHERE_NAME].matrix_world.translation)
+    scale = np.array(scene.objects[scene['rig_camera']].scale)
+    return look_at_poses(positions, target, scale)
+
+def get_cached_cam_positions(scene):
+    '''
+    Returns the camera positions stored by the scene preparation as an array of shape [repetitions, num_cameras, 3],
+    or None if the scene was prepared without caching them.
+    '''
+    if 'cam_positions' not in scene.keys():
+        return None
+    return np.asarray(scene['cam_positions'], dtype=np.float64).reshape(tuple(scene['cam_positions_shape']))
+
+def look_at_poses(positions, target, scale=(1.0, 1.0, 1.0)):
+    '''
+    Batched equivalent of Blender's TRACK_TO constraint (track axis -Z, up axis Y) for cameras at the given positions.
+    Inputs:
+    - positions: array of shape [..., 3] with the camera locations
+    - target: the xyz location all cameras look at
+    - scale: the object scale of the cameras
+    Outputs:
+    - c2w: array of shape [..., 4, 4] containing the camera-to-world matrices in the Blender convention
+    '''
+    positions = np.asarray(positions, dtype=np.float64)
+    forward = np.asarray(target, dtype=np.float64) - positions
+    z_axis = -forward / np.linalg.norm(forward, axis=-1, keepdims=True)
+
+    # local Y points as closely as possible towards world up, fall back to world Y when looking straight up or down
+    up = np.broadcast_to(np.array([0.0, 0.0, 1.0]), z_axis.shape).copy()
+    degenerate = np.abs(z_axis[..., 2]) > 1 - 1e-9
+    up[degenerate] = np.array([0.0, 1.0, 0.0])
+    y_axis = up - np.sum(up * z_axis, axis=-1, keepdims=True) * z_axis
+    y_axis /= np.linalg.norm(y_axis, axis=-1, keepdims=True)
+    x_axis = np.cross(y_axis, z_axis)
+
+    c2w = np.zeros(positions.shape[:-1] + (4, 4))
+    c2w[..., :3, 0] = x_axis * scale[0]
+    c2w[..., :3, 1] = y_axis * scale[1]
+    c2w[..., :3, 2] = z_axis * scale[2]
+    c2w[..., :3, 3] = positions
+    c2w[..., 3, 3] = 1
+    return c2w
+
+def invert_poses(poses):
+    '''
+    Batched inverse of poses of shape [..., 4, 4] whose rotation part has orthogonal (possibly scaled) columns,
+    using the transpose instead of a general matrix inverse.
+    '''
+    rotation = poses[..., :3, :3]
+    inv_rotation = np.swapaxes(rotation, -1, -2) / np.sum(rotation ** 2, axis=-2)[..., :, None]
+    inverse = np.zeros_like(poses)
+    inverse[..., :3, :3] = inv_rotation
+    inverse[..., :3, 3] = -(inv_rotation @ poses[..., :3, 3:4])[..., 0]
+    inverse[..., 3, 3] = 1
+    return inverse
 
 def remove_trailing_zeros(obj):
     """Ensures numbers that can be integers are written as integers."""
@@ -151,42 +244,107 @@ def convert_blender_to_opencv(pose):
     rotated = rotation_about_y @ rotated
     return rotated
 
-def rotate_ply_to_opencv(ply_path):
+# combined rotation of world coordinates from Blender to OpenCV: first about x by -90 degrees, then about y by +90 degrees
+BLENDER_TO_OPENCV_WORLD = np.array([[0, 0, 1], [0, 1, 0], [-1, 0, 0]]) @ np.array([[1, 0, 0], [0, 0, -1], [0, 1, 0]])
+
+PLY_DTYPES = {
+    'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8',
+}
+
+def read_ply_header(f):
+    '''
+    Parse the header of an open (binary mode) PLY file.
+    Returns the format string, the header length in bytes and a list of elements as (name, count, [(property, type), ...]).
+    List properties are recorded with the type 'list'.
+    '''
+    fmt = None
+    elements = []
+    header_len = 0
+    while True:
+        line = f.readline()
+        if not line:
+            raise ValueError('Unexpected end of file while reading the PLY header')
+        header_len += len(line)
+        tokens = line.decode('ascii').split()
+        if not tokens:
+            continue
+        if tokens[0] == 'format':
+            fmt = tokens[1]
+        elif tokens[0] == 'element':
+            elements.append((tokens[1], int(tokens[2]), []))
+        elif tokens[0] == 'property':
+            prop_type = 'list' if tokens[1] == 'list' else tokens[1]
+            elements[-1][2].append((tokens[-1], prop_type))
+        elif tokens[0] == 'end_header':
+            break
+    return fmt, header_len, elements
+
+def rotate_ply_to_opencv(ply_path, out_path=None):
     '''
     Rotate a PLY file from Blender to the OpenCV world coordinate frame.
+    Binary files are rewritten in place through a memory map, ASCII files are parsed and rewritten in bulk.
+    If out_path is given, the rotated copy is written there and the original file is left untouched.
     '''
-    with(open(ply_path, 'r')) as f: 
-        lines = f.readlines()
+    if out_path is not None and out_path != ply_path:
+        shutil.copyfile(ply_path, out_path)
+        ply_path = out_path
 
-    for i,line in enumerate(lines): # find the number of points and the start index
-        if 'element vertex' in line:
-            num_points = int(line.split()[-1])
-        if 'end_header' in line:
-            start_index = i + 1
-            break
+    with open(ply_path, 'rb') as f:
+        fmt, header_len, elements = read_ply_header(f)
+
+    vertex_idx = [name for name, _, _ in elements].index('vertex')
+    _, num_points, properties = elements[vertex_idx]
+    if num_points == 0:
+        return
+    prop_names = [name for name, _ in properties]
+    if 'list' in [prop_type for _, prop_type in properties]:
+        raise ValueError('List properties on PLY vertices are not supported')
+
+    if fmt == 'ascii':
+        rotate_ascii_ply_vertices(ply_path, header_len, num_points, properties)
+        return
+
+    if any('list' in [prop_type for _, prop_type in props] for _, _, props in elements[:vertex_idx]):
+        raise ValueError('Vertex element must precede any PLY element with list properties')
+    byte_order = '<' if fmt == 'binary_little_endian' else '>'
+    dtype = np.dtype([(name, byte_order + PLY_DTYPES[prop_type]) for name, prop_type in properties])
+    offset = header_len + sum(count * np.dtype([(n, byte_order + PLY_DTYPES[t]) for n, t in props]).itemsize for _, count, props in elements[:vertex_idx])
+
+    vertices = np.memmap(ply_path, dtype=dtype, mode='r+', offset=offset, shape=(num_points,))
+    for columns in (('x', 'y', 'z'), ('nx', 'ny', 'nz')):
+        if all(column in prop_names for column in columns):
+            stacked = np.stack([vertices[column] for column in columns], axis=1).astype(np.float64)
+            rotated = stacked @ BLENDER_TO_OPENCV_WORLD.T
+            for i, column in enumerate(columns):
+                vertices[column] = rotated[:, i]
+    vertices.flush()
+    del vertices
+    return
 
-    # Identify which lines to alter
-    old_lines = lines[start_index:start_index+num_points]
-    coordinates = np.array([line.split()[:3] for line in old_lines], dtype=np.float64)
-    normals = np.array([line.split()[3:6] for line in old_lines], dtype=np.float64)
-
-    # Step 1: Rotate all vertices and normals about x (clockwise), so by -90 degrees
-    rotation_about_x = np.array([[1, 0, 0], [0, 0, -1], [0, 1, 0]])
-    rotated = (rotation_about_x @ coordinates.T).T
-    rotated_normals = (rotation_about_x @ normals.T).T
-
-    # Step 2: Rotate all vertices and normals about y (counter-clockwise), so by +90 degrees
-    rotation_about_y = np.array([[0, 0, 1], [0, 1, 0], [-1, 0, 0]])
-    rotated = (rotation_about_y @ rotated.T).T
-    rotated_normals = (rotation_about_y @ rotated_normals.T).T
-
-    # Format the new lines to match the old ones
-    new_lines = [' '.join([str(coord) for coord in rotated[i]] + [str(norm) for norm in rotated_normals[i]]) + ' ' + ' '.join(old_lines[i].split()[6:]) + '\n' for i in range(num_points)]
-    new_lines = [str.replace(line, '0.0 ', '0 ') for line in new_lines]
-    # And save the file with the new lines
-    lines[start_index:start_index+num_points] = new_lines
-    with open(ply_path, 'w') as f:
-        f.writelines(lines)
+def rotate_ascii_ply_vertices(ply_path, header_len, num_points, properties):
+    '''
+    Rotate the vertex block of an ASCII PLY file in bulk. Faces and other elements are copied over unchanged.
+    '''
+    with open(ply_path, 'rb') as f:
+        header = f.read(header_len)
+        lines = f.read().decode('ascii').splitlines(keepends=True)
+
+    prop_names = [name for name, _ in properties]
+    values = np.loadtxt(lines[:num_points], dtype=np.float64, ndmin=2)
+    for columns in (('x', 'y', 'z'), ('nx', 'ny', 'nz')):
+        if all(column in prop_names for column in columns):
+            indices = [prop_names.index(column) for column in columns]
+            values[:, indices] = values[:, indices] @ BLENDER_TO_OPENCV_WORLD.T
+
+    # floats keep enough digits to round-trip single precision, integer properties (e.g. colours) stay integers
+    fmts = ['%.9g' if PLY_DTYPES[prop_type].startswith('f') else '%d' for _, prop_type in properties]
+    with open(ply_path, 'wb') as f:
+        f.write(header)
+        np.savetxt(f, values, fmt=fmts, delimiter=' ')
+        f.write(''.join(lines[num_points:]).encode('ascii'))
     return
 
 def rotate_coords_to_opencv(coords_dict):
@@ -221,6 +379,7 @@ def create_sphere(context):
         bpy.ops.object.empty_add(type='SPHERE')
         empty = context.active_object
         empty.name = SPHERE_NAME
+        mark_owned(empty)
         empty.location = scene.sphere_location
         empty.rotation_euler = scene.sphere_rotation
         empty.scale = scene.sphere_scale
@@ -240,6 +399,28 @@ def visualize_sphere(self, context):
             bpy.data.objects[SPHERE_NAME].hide_set(True)
     return
 
+def keyframe_locations(obj, first_frame, locations):
+    '''
+    Keyframe the location of an object at consecutive frames starting at first_frame, from an array of shape [frames, 3].
+    Fills the F-curves in bulk instead of calling keyframe_insert for every frame, with constant interpolation so the object
+    jumps to its new location at each frame.
+    '''
+    frames = np.arange(first_frame, first_frame + len(locations), dtype=np.float32)
+    obj.animation_data_create()
+    if obj.animation_data.action is None:
+        obj.animation_data.action = bpy.data.actions.new(name=f"{obj.name}Action")
+        mark_owned(obj.animation_data.action)
+    action = obj.animation_data.action
+
+    for axis in range(3):
+        fcurve = action.fcurves.find('location', index=axis) or action.fcurves.new('location', index=axis, action_group='Object Transforms')
+        fcurve.keyframe_points.clear()
+        fcurve.keyframe_points.add(len(locations))
+        fcurve.keyframe_points.foreach_set('co', np.column_stack((frames, locations[:, axis])).astype(np.float32).ravel())
+        fcurve.keyframe_points.foreach_set('interpolation', np.zeros(len(locations), dtype=np.int32)) # 0 is CONSTANT
+        fcurve.update()
+    return
+
 def save_log_file(scene, focal_length, directory):
     now = datetime.datetime.now()
 
@@ -261,12 +442,17 @@ def save_log_file(scene, focal_length, directory):
     logdata['View Selection'] = scene.view_selection
     logdata['Dataset Name'] = scene.dataset_name
     logdata['Camera Distribution'] = 'Static uniform' if scene.cam_distribution else 'Random per-frame'
+    logdata['Camera Sampling'] = 'Legacy' if scene.legacy_cam_sampling else 'Vectorized'
+    logdata['Masks and Composites'] = compositor.has_compositor_outputs(scene)
+    logdata['Dense Initial Point Cloud'] = scene.init_point_cloud
+    logdata['Camera Setup'] = 'Single camera rig' if 'rig_camera' in scene.keys() else 'One camera per view'
     logdata['Camera Coordinate Frame'] = 'OpenCV/COLMAP' if scene.coordinate_frame else 'NeRF/Blender'
 
     save_json(directory, filename='log.txt', data=logdata)
     return
 
 # export vertex colors for each visible mesh
+@handlers_suspended()
 def save_splats_ply(scene, directory):
 
     bpy.context.scene.frame_set(scene.first_frame_nr) # set the context to the first frame!
@@ -293,11 +479,14 @@ def save_splats_ply(scene, directory):
         if obj.type == 'MESH' and is_object_visible(obj):
             obj.select_set(True)
 
-    # save ply file
-    bpy.ops.wm.ply_export(filepath=os.path.join(directory, 'points3d.ply'), export_normals=True, export_colors='SRGB', export_attributes=False, export_triangulated_mesh=True, ascii_format=True)
+    # save ply file, exported only once, the OpenCV version is a rotated copy of the NeRF/Blender one
+    ply_path = os.path.join(directory, 'points3d.ply')
     if scene.coordinate_frame:
-        bpy.ops.wm.ply_export(filepath=os.path.join(directory, 'points3d(in_nerf_coordinate_frame).ply'), export_normals=True, export_colors='SRGB', export_attributes=False, export_triangulated_mesh=True, ascii_format=True)
-        rotate_ply_to_opencv(os.path.join(directory, 'points3d.ply'))
+        nerf_ply_path = os.path.join(directory, 'points3d(in_nerf_coordinate_frame).ply')
+        bpy.ops.wm.ply_export(filepath=nerf_ply_path, export_normals=True, export_colors='SRGB', export_attributes=False, export_triangulated_mesh=True, ascii_format=scene.ply_ascii)
+        rotate_ply_to_opencv(nerf_ply_path, out_path=ply_path)
+    else:
+        bpy.ops.wm.ply_export(filepath=ply_path, export_normals=True, export_colors='SRGB', export_attributes=False, export_triangulated_mesh=True, ascii_format=scene.ply_ascii)
 
     # remove temporary vertex colors
     for obj in scene.objects:
@@ -315,12 +504,202 @@ def save_splats_ply(scene, directory):
     bpy.ops.object.mode_set(mode=init_mode)
     return
 
-def save_meshes_per_frame(scene, out_directory):
-    scene.frame_set(scene.first_frame_nr) # set the context to the first frame!
+def sample_triangles(corners, size, rng):
+    '''
+    Area-weighted uniform sampling on triangles given by their corners [T, 3, 3].
+    Returns the sampled triangle indices [size] and barycentric weights [size, 3].
+    '''
+    areas = 0.5 * np.linalg.norm(np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]), axis=1)
+    cumulative = np.cumsum(areas, dtype=np.float64)
+    face_idx = np.minimum(np.searchsorted(cumulative, rng.random(size) * cumulative[-1], side='right'), len(corners) - 1)
+    r1 = np.sqrt(rng.random(size))
+    r2 = rng.random(size)
+    return face_idx, np.stack([1 - r1, r1 * (1 - r2), r1 * r2], axis=1)
+
+@handlers_suspended()
+def save_init_point_cloud(scene, directory, size=150000):
+    '''
+    Sample the dense initial point cloud (init_pt_cld.npz, [x, y, z, r, g, b, 1]) directly from the evaluated visible meshes
+    at the first frame, instead of exporting points3d.ply and sampling it with Open3D in post-processing.
+    Colours are interpolated from the active colour attribute (per vertex or per face corner), meshes without one are green.
+    Points are in the same coordinate frame as points3d.ply.
+    '''
+    standard_green = np.array([0, 102, 17]) / 255.0 # same fallback colour as in the post-processing script
+    scene.frame_set(scene.first_frame_nr)
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+
+    corners, corner_colours = [], []
+    for obj in scene.objects:
+        if obj.type != 'MESH' or not is_object_visible(obj):
+            continue
+        eval_obj = obj.evaluated_get(depsgraph)
+        eval_mesh = eval_obj.to_mesh()
+        eval_mesh.calc_loop_triangles()
+        coords = np.empty(len(eval_mesh.vertices) * 3, dtype=np.float64)
+        triangles = np.empty(len(eval_mesh.loop_triangles) * 3, dtype=np.int64)
+        loops = np.empty(len(eval_mesh.loop_triangles) * 3, dtype=np.int64)
+        eval_mesh.vertices.foreach_get('co', coords)
+        eval_mesh.loop_triangles.foreach_get('vertices', triangles)
+        eval_mesh.loop_triangles.foreach_get('loops', loops)
+
+        colour_attribute = eval_mesh.color_attributes.active_color
+        if colour_attribute is not None and colour_attribute.domain in ('POINT', 'CORNER'):
+            colours = np.empty(len(colour_attribute.data) * 4, dtype=np.float64)
+            colour_attribute.data.foreach_get('color_srgb', colours)
+            colours = colours.reshape(-1, 4)[:, :3][loops if colour_attribute.domain == 'CORNER' else triangles]
+        else:
+            colours = np.tile(standard_green, (len(triangles), 1))
+        eval_obj.to_mesh_clear()
+
+        world_matrix = np.array(eval_obj.matrix_world)
+        world_coords = coords.reshape(-1, 3) @ world_matrix[:3, :3].T + world_matrix[:3, 3]
+        corners.append(world_coords[triangles].reshape(-1, 3, 3))
+        corner_colours.append(colours.reshape(-1, 3, 3))
+
+    if not corners:
+        return
+    corners = np.concatenate(corners)
+    corner_colours = np.concatenate(corner_colours)
+    face_idx, bary = sample_triangles(corners, size, np.random.default_rng(scene.seed))
+    points = np.einsum('nk,nkd->nd', bary, corners[face_idx])
+    colours = np.einsum('nk,nkd->nd', bary, corner_colours[face_idx])
+    if scene.coordinate_frame:
+        points = points @ BLENDER_TO_OPENCV_WORLD.T
+
+    np.savez(os.path.join(directory, 'init_pt_cld.npz'), data=np.hstack([points, colours, np.ones((size, 1))]))
+    return
+
+## single sweep over the animation frames, shared by all per-frame exporters
+
+class BackgroundWriter:
+    '''
+    Runs file writing jobs in a background thread, so that disk I/O overlaps with the evaluation of the next frames.
+    The queue is bounded: submit blocks once max_pending jobs are waiting, which caps the memory held by pending frames.
+    Jobs must not touch bpy. The first exception raised by a job is re-raised by the next submit or by close.
+    '''
+    def __init__(self, max_pending=8):
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            function, args = job
+            if self.error is None: # skip the remaining jobs after a failure
+                try:
+                    function(*args)
+                except BaseException as error:
+                    self.error = error
+
+    def submit(self, function, *args):
+        if self.error is not None:
+            raise self.error
+        self.queue.put((function, args))
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+class FrameConsumer:
+    '''
+    Per-frame exporter fed by sweep_frames. begin is called before the first frame, frame once per frame after the scene
+    has been evaluated, and end after the last frame. Files should be written through writer.submit.
+    '''
+    stage = 'frames' # name of the export stage in stats.json
+
+    def begin(self, scene, writer):
+        pass
+
+    def frame(self, scene, depsgraph, frame, writer):
+        pass
+
+    def end(self, scene, writer):
+        pass
+
+@handlers_suspended()
+def sweep_frames(scene, consumers, frames=None, max_pending=8):
+    '''
+    Step through the frames (default: the whole animation) once, evaluate the depsgraph once per frame and hand it to every consumer.
+    Returns the time spent per stage: 'frame_evaluation' for frame_set and the depsgraph, and the stage name of each consumer
+    for its own work, including any time it waited for the writer queue.
+    '''
+    frames = range(scene.first_frame_nr, scene.final_frame_nr + 1) if frames is None else frames
+    timings = {'frame_evaluation': 0.0}
+    for consumer in consumers:
+        timings.setdefault(consumer.stage, 0.0)
+
+    def timed(stage, function, *args):
+        start = time.perf_counter()
+        function(*args)
+        timings[stage] += time.perf_counter() - start
+
+    writer = BackgroundWriter(max_pending)
+    try:
+        for consumer in consumers:
+            timed(consumer.stage, consumer.begin, scene, writer)
+        for frame in frames:
+            start = time.perf_counter()
+            scene.frame_set(frame)
+            depsgraph = bpy.context.evaluated_depsgraph_get()
+            timings['frame_evaluation'] += time.perf_counter() - start
+            for consumer in consumers:
+                timed(consumer.stage, consumer.frame, scene, depsgraph, frame, writer)
+        for consumer in consumers:
+            timed(consumer.stage, consumer.end, scene, writer)
+    finally:
+        start = time.perf_counter()
+        writer.close() # wait for the remaining files
+        timings['file_writing'] = time.perf_counter() - start
+    return timings
+
+class CameraPoses(FrameConsumer):
+    '''
+    Read the camera extrinsics from the evaluated scene. Result in self.extrinsics after the sweep, shape [num_frames, num_cameras, 4, 4].
+    Static cameras are only read at the first frame.
+    '''
+    stage = 'metadata'
+
+    def __init__(self, camera_list):
+        self.camera_list = camera_list
+        self.camera_extrinsics = []
+        self.extrinsics = None
+
+    def frame(self, scene, depsgraph, frame, writer):
+        if scene.cam_distribution and self.camera_extrinsics:
+            return # if cameras are static, only one set of extrinsics is needed
+        frame_extrinsics = []
+        for camera in self.camera_list:
+            name = camera[1]
+            cam_obj = scene.objects[name]
+            cam_data = np.array(cam_obj.matrix_world)
+            if scene.coordinate_frame: 
+                cam_data = convert_blender_to_opencv(cam_data) # convert from NeRF/Blender to OpenCV/COLMAP coordinate frame
+            w2c = np.linalg.inv(cam_data) #! invert to get the w2c matrix, not the c2w matrix
+            frame_extrinsics.append(listify_matrix(w2c))
+        self.camera_extrinsics.append(frame_extrinsics)
+
+    def end(self, scene, writer):
+        if scene.cam_distribution:
+            self.camera_extrinsics = np.tile(self.camera_extrinsics, (scene.final_frame_nr - scene.first_frame_nr + 1, 1, 1, 1))
+        self.extrinsics = np.asarray(self.camera_extrinsics)
+
+class PlyMeshes(FrameConsumer):
+    '''
+    Export the visible meshes of every frame as frame_<frame>.ply with Blender's PLY exporter.
+    The export itself needs bpy, the rotation to the OpenCV world frame runs in the writer thread.
+    '''
+    stage = 'meshes'
 
-    for frame in range(scene.first_frame_nr, scene.final_frame_nr + 1):
-        # Loop over frames one by one
-        scene.frame_set(frame)
+    def __init__(self, out_directory):
+        self.out_directory = out_directory
+
+    def frame(self, scene, depsgraph, frame, writer):
         if bpy.context.object is None or bpy.context.active_object is None:
             bpy.context.view_layer.objects.active = bpy.data.objects[0]
         bpy.ops.object.mode_set(mode='OBJECT')
@@ -333,44 +712,175 @@ def save_meshes_per_frame(scene, out_directory):
                 obj.select_set(True)   
     
         filename = f"frame_{frame:04d}.ply"
-        filepath = os.path.join(out_directory, filename)
+        filepath = os.path.join(self.out_directory, filename)
 
-        bpy.ops.wm.ply_export(filepath=filepath, export_selected_objects=True, export_normals=True, export_colors='NONE', export_attributes=False, export_triangulated_mesh=True, ascii_format=True)
-        rotate_ply_to_opencv(filepath)
+        bpy.ops.wm.ply_export(filepath=filepath, export_selected_objects=True, export_normals=True, export_colors='NONE', export_attributes=False, export_triangulated_mesh=True, ascii_format=scene.ply_ascii)
+        writer.submit(rotate_ply_to_opencv, filepath)
         # TODO: By default these meshes are saved in OpenCV coordinate frame, the switch so far only affects camera poses, not these meshes
 
         bpy.context.view_layer.objects.active = init_active_object # Restore the active object
         bpy.ops.object.select_all(action='DESELECT') # Deselect all again
-    return
 
-def track_vertices(scene, out_file):
-    trajectories = {}
-    for frame in range(scene.first_frame_nr, scene.final_frame_nr + 1):
-        bpy.context.scene.frame_set(frame)
+class CachedMeshes(FrameConsumer):
+    '''
+    Export the visible meshes at every frame without going through the PLY exporter.
+    Evaluated meshes are read in bulk, the triangle list of each object is written only once as <object index>_<object>_topology_<n>.npy
+    and again only when its topology hash changes, and every frame gets a compact frame_<frame>.npz holding the float32
+    world space vertex positions ('vertices_<i>') and normals ('normals_<i>') of object i.
+    index.json lists the objects, their topologies and the frames from which on they are valid.
+    Like PlyMeshes, everything is written in the OpenCV world coordinate frame.
+    '''
+    stage = 'meshes'
 
-        # Evaluate depsgraph to get modifiers and animations applied
-        depsgraph = bpy.context.evaluated_depsgraph_get()
-        mesh_objects = [obj for obj in bpy.context.scene.objects if obj.type == 'MESH']
+    def __init__(self, out_directory):
+        self.out_directory = out_directory
+        self.object_ids = {}
+
+    def begin(self, scene, writer):
+        os.makedirs(self.out_directory, exist_ok=True)
+        self.index = {'frames': list(range(scene.first_frame_nr, scene.final_frame_nr + 1)), 'coordinate_frame': 'OpenCV/COLMAP', 'objects': []}
+
+    def frame(self, scene, depsgraph, frame, writer):
+        frame_arrays = {}
+        for obj in scene.objects:
+            if obj.type != 'MESH' or not is_object_visible(obj):
+                continue
+            if obj.name not in self.object_ids:
+                self.object_ids[obj.name] = len(self.index['objects'])
+                self.index['objects'].append({'name': obj.name, 'topologies': []})
+            obj_id = self.object_ids[obj.name]
+            topologies = self.index['objects'][obj_id]['topologies']
+
+            eval_obj = obj.evaluated_get(depsgraph)
+            eval_mesh = eval_obj.to_mesh()
+            eval_mesh.calc_loop_triangles()
+            num_verts = len(eval_mesh.vertices)
+            coords = np.empty(num_verts * 3, dtype=np.float32)
+            normals = np.empty(num_verts * 3, dtype=np.float32)
+            triangles = np.empty(len(eval_mesh.loop_triangles) * 3, dtype=np.int32)
+            eval_mesh.vertices.foreach_get('co', coords)
+            eval_mesh.vertex_normals.foreach_get('vector', normals)
+            eval_mesh.loop_triangles.foreach_get('vertices', triangles)
+            eval_obj.to_mesh_clear()
+
+            # only write the face list when the topology differs from the last one written for this object
+            topology_hash = hashlib.sha1(np.int64(num_verts).tobytes() + triangles.tobytes()).hexdigest()
+            if not topologies or topologies[-1]['hash'] != topology_hash:
+                filename = f"{obj_id}_{bpy.path.clean_name(obj.name)}_topology_{len(topologies)}.npy" # clean_name alone is not unique (Cube.001, Cube_001)
+                writer.submit(np.save, os.path.join(self.out_directory, filename), triangles.reshape(-1, 3))
+                topologies.append({'first_frame': frame, 'file': filename, 'hash': topology_hash, 'num_vertices': num_verts, 'num_triangles': len(triangles) // 3})
+
+            world_matrix = np.array(eval_obj.matrix_world)
+            rotation = BLENDER_TO_OPENCV_WORLD @ world_matrix[:3, :3]
+            translation = BLENDER_TO_OPENCV_WORLD @ world_matrix[:3, 3]
+            normal_matrix = BLENDER_TO_OPENCV_WORLD @ np.linalg.inv(world_matrix[:3, :3]).T
+            world_normals = normals.reshape(-1, 3) @ normal_matrix.T.astype(np.float32)
+            world_normals /= np.maximum(np.linalg.norm(world_normals, axis=1, keepdims=True), 1e-12)
+            frame_arrays[f"vertices_{obj_id}"] = coords.reshape(-1, 3) @ rotation.T.astype(np.float32) + translation.astype(np.float32)
+            frame_arrays[f"normals_{obj_id}"] = world_normals
+
+        writer.submit(lambda path, arrays: np.savez(path, **arrays), os.path.join(self.out_directory, f"frame_{frame:04d}.npz"), frame_arrays)
+
+    def end(self, scene, writer):
+        writer.submit(save_json, self.out_directory, 'index.json', self.index)
+
+class VertexTrajectories(FrameConsumer):
+    '''Track the world coordinates of all mesh vertices, written as one nested JSON file in the OpenCV world frame at the end.'''
+    stage = 'trajectories'
+
+    def __init__(self, out_file):
+        self.out_file = out_file
+        self.trajectories = {}
+
+    def frame(self, scene, depsgraph, frame, writer):
+        mesh_objects = [obj for obj in scene.objects if obj.type == 'MESH']
         for obj in mesh_objects:
             eval_obj = obj.evaluated_get(depsgraph)
             eval_mesh = eval_obj.to_mesh()
             world_matrix = eval_obj.matrix_world
 
             obj_name = obj.name
-            if obj_name not in trajectories:
-                trajectories[obj_name] = {}
+            if obj_name not in self.trajectories:
+                self.trajectories[obj_name] = {}
 
             for idx, vert in enumerate(eval_mesh.vertices):
                 world_coord = world_matrix @ vert.co
-                trajectories[obj_name].setdefault(idx, {})[frame] = (world_coord.x, world_coord.y, world_coord.z)
+                self.trajectories[obj_name].setdefault(idx, {})[frame] = (world_coord.x, world_coord.y, world_coord.z)
 
             eval_obj.to_mesh_clear()
-    
-    rotated = rotate_coords_to_opencv(trajectories)
-    with open(out_file, 'w') as f:
-        json.dump(rotated, f, indent=4)
-    return
-    
+
+    def end(self, scene, writer):
+        def write(out_file, trajectories):
+            with open(out_file, 'w') as f:
+                json.dump(rotate_coords_to_opencv(trajectories), f, indent=4)
+        writer.submit(write, self.out_file, self.trajectories)
+
+class DenseVertexTrajectories(FrameConsumer):
+    '''
+    Dense alternative to VertexTrajectories for large meshes.
+    Vertex coordinates are read in bulk and transformed with one matrix product per object and frame.
+    Each object's trajectory is streamed into a memory-mapped float32 array of shape [frames, vertices, 3] stored as <object index>_<object>.npy,
+    and a small index.json lists the object names, their files and vertex counts.
+    Like VertexTrajectories, coordinates are always written in the OpenCV world coordinate frame.
+    '''
+    stage = 'trajectories'
+
+    def __init__(self, out_directory):
+        self.out_directory = out_directory
+        self.trajectories = {}
+
+    def begin(self, scene, writer):
+        os.makedirs(self.out_directory, exist_ok=True)
+        self.frames = list(range(scene.first_frame_nr, scene.final_frame_nr + 1))
+        self.mesh_objects = [obj for obj in scene.objects if obj.type == 'MESH']
+        self.index = {'frames': self.frames, 'coordinate_frame': 'OpenCV/COLMAP', 'objects': []}
+
+    def frame(self, scene, depsgraph, frame, writer):
+        f_idx = self.frames.index(frame)
+        for obj in self.mesh_objects:
+            eval_obj = obj.evaluated_get(depsgraph)
+            eval_mesh = eval_obj.to_mesh()
+            num_verts = len(eval_mesh.vertices)
+
+            if obj.name not in self.trajectories:
+                filename = f"{len(self.index['objects'])}_{bpy.path.clean_name(obj.name)}.npy" # clean_name alone is not unique (Cube.001, Cube_001)
+                self.trajectories[obj.name] = np.lib.format.open_memmap(os.path.join(self.out_directory, filename), mode='w+', dtype=np.float32, shape=(len(self.frames), num_verts, 3))
+                self.index['objects'].append({'name': obj.name, 'file': filename, 'vertex_count': num_verts})
+            elif self.trajectories[obj.name].shape[1] != num_verts:
+                eval_obj.to_mesh_clear()
+                raise ValueError(f"Vertex count of '{obj.name}' changed at frame {frame}, dense trajectories require a fixed vertex count")
+
+            coords = np.empty(num_verts * 3, dtype=np.float32)
+            eval_mesh.vertices.foreach_get('co', coords)
+            eval_obj.to_mesh_clear()
+
+            # fold the world matrix and the Blender to OpenCV rotation into a single affine transform
+            world_matrix = np.array(eval_obj.matrix_world)
+            rotation = BLENDER_TO_OPENCV_WORLD @ world_matrix[:3, :3]
+            translation = BLENDER_TO_OPENCV_WORLD @ world_matrix[:3, 3]
+            writer.submit(self.trajectories[obj.name].__setitem__, f_idx, coords.reshape(-1, 3) @ rotation.T.astype(np.float32) + translation.astype(np.float32))
+
+    def end(self, scene, writer):
+        def write(trajectories, out_directory, index):
+            for trajectory in trajectories:
+                trajectory.flush()
+            save_json(out_directory, filename='index.json', data=index)
+        writer.submit(write, list(self.trajectories.values()), self.out_directory, self.index)
+        self.trajectories = {}
+
+# single-exporter entry points, RenderScene.execute runs all enabled exporters in one sweep instead
+def save_meshes_per_frame(scene, out_directory):
+    sweep_frames(scene, [PlyMeshes(out_directory)])
+
+def save_meshes_cached(scene, out_directory):
+    sweep_frames(scene, [CachedMeshes(out_directory)])
+
+def track_vertices(scene, out_file):
+    sweep_frames(scene, [VertexTrajectories(out_file)])
+
+def track_vertices_dense(scene, out_directory):
+    sweep_frames(scene, [DenseVertexTrajectories(out_directory)])
+
 # check whether an object is visible in render
 def is_object_visible(obj):
     if obj.hide_render:
@@ -381,6 +891,93 @@ def is_object_visible(obj):
             return False
     return True
 
+def save_binary_metadata(directory, width, height, camera_matrix, extrinsics, file_extension):
+    '''
+    Write a compact binary copy of meta.json as a set of raw .npy files that can be memory-mapped:
+    w2c.npy [num_frames, num_cameras, 4, 4] and k.npy [3, 3] (shared by all cameras), with the scalar fields in index.json.
+    File names follow the meta.json pattern '<cam_id>/<frame_id>.<ext>' and are not stored explicitly.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    extrinsics = np.asarray(extrinsics, dtype=np.float64)
+    np.save(os.path.join(directory, 'w2c.npy'), extrinsics)
+    np.save(os.path.join(directory, 'k.npy'), np.asarray(camera_matrix, dtype=np.float64))
+
+    index = {
+        'w': remove_trailing_zeros(width),
+        'h': remove_trailing_zeros(height),
+        'num_frames': extrinsics.shape[0],
+        'num_cameras': extrinsics.shape[1],
+        'file_extension': file_extension,
+    }
+    save_json(directory, filename='index.json', data=index)
+    return
+
+# settings each export stage depends on, in addition to the saved .blend file itself
+EXPORT_SETTINGS = {
+    'splats': ['first_frame_nr', 'coordinate_frame', 'ply_ascii'],
+    'init_point_cloud': ['first_frame_nr', 'coordinate_frame', 'init_point_cloud_size', 'seed'],
+    'metadata': ['first_frame_nr', 'final_frame_nr', 'nb_cameras', 'cam_distribution', 'coordinate_frame', 'depsgraph_extrinsics', 'binary_metadata'],
+    'meshes': ['first_frame_nr', 'final_frame_nr', 'ply_ascii', 'mesh_export_format'],
+    'trajectories': ['first_frame_nr', 'final_frame_nr', 'trajectory_format'],
+}
+EXPORT_STATE_FILE = '.export_state.json'
+
+def export_fingerprint(scene, stage):
+    '''
+    Hash of everything an export stage depends on: its settings, the camera setup and the saved .blend file.
+    Returns None for unsaved changes, which cannot be fingerprinted.
+    '''
+    if bpy.data.is_dirty or not bpy.data.filepath:
+        return None
+    inputs = {setting: getattr(scene, setting) for setting in EXPORT_SETTINGS[stage]}
+    inputs['blend_file'] = [bpy.data.filepath, os.path.getmtime(bpy.data.filepath)]
+    inputs['version'] = scene.plenoblendernerf_version
+    if stage == 'metadata':
+        inputs['cam_handles'] = [list(handle) for handle in scene['cam_handles']]
+        inputs['intrinsics'] = get_camera_intrinsics(scene, scene.objects[scene['cam_handles'][0][1]])
+        positions = get_cached_cam_positions(scene)
+        inputs['cam_positions'] = None if positions is None else hashlib.sha1(positions.tobytes()).hexdigest()
+    return hashlib.sha1(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+def load_export_state(directory):
+    filepath = os.path.join(directory, EXPORT_STATE_FILE)
+    return json.load(open(filepath)) if os.path.exists(filepath) else {}
+
+def is_valid_image(filepath):
+    '''
+    Cheap integrity check of a rendered image without decoding it: non-empty, and for PNG and JPEG files intact start and end markers.
+    '''
+    if not os.path.isfile(filepath) or os.path.getsize(filepath) < 12:
+        return False
+    with open(filepath, 'rb') as f:
+        head = f.read(8)
+        f.seek(-12, os.SEEK_END)
+        tail = f.read(12)
+    if head.startswith(b'\x89PNG'):
+        return head == b'\x89PNG\r\n\x1a\n' and tail == b'\x00\x00\x00\x00IEND\xaeB`\x82'
+    if head.startswith(b'\xff\xd8'):
+        return tail.endswith(b'\xff\xd9')
+    return True
+
+def find_missing_renders(scene, directory):
+    '''
+    Returns {frame: [camera numbers]} for every (frame, view) pair whose image is missing or corrupt in <directory>/alpha_ims/,
+    or, with compositor outputs, whose composite in ims/ or mask in seg/ is missing or corrupt.
+    '''
+    file_extension = scene.render.image_settings.file_format.lower()
+    folders = list(compositor.COMPOSITOR_NODES) if compositor.has_compositor_outputs(scene) else []
+    def rendered(camera_num, frame_num):
+        if not is_valid_image(camera_image_path(directory, camera_num, frame_num, file_extension)):
+            return False
+        return all(is_valid_image(os.path.join(directory, folder, str(camera_num), f"{frame_num:06d}.png")) for folder in folders)
+
+    missing = {}
+    for frame_num in range(scene.first_frame_nr, scene.final_frame_nr + 1):
+        cams = [camera_num for camera_num in range(len(scene['cam_handles'])) if not rendered(camera_num, frame_num)]
+        if cams:
+            missing[frame_num] = cams
+    return missing
+
 def save_json(directory, filename, data, indent=4):
     filepath = os.path.join(directory, filename)
     with open(filepath, 'w') as file:
@@ -393,15 +990,201 @@ def listify_matrix(matrix):
         matrix_list.append(list(row))
     return matrix_list
 
+## compositor outputs: masks (seg/) and black background composites (ims/) written while rendering
+
+def setup_compositor_outputs(scene):
+    '''
+    Add compositor File Output nodes that write every rendered view composited over black to ims/ (8-bit RGB) and its
+    foreground mask to seg/ (8-bit grayscale, 255 where the 8-bit alpha would be non-zero), like create_segmentation_masks
+    and bg_composite do afterwards. The output paths are set before rendering, see set_compositor_paths.
+    '''
+    # record what the add-on changes in the user's compositor, so that the scene reset can undo exactly that (see restore_compositor)
+    existing_nodes = set(scene.node_tree.nodes.keys()) if scene.node_tree is not None else set()
+    if 'compositor_use_nodes' not in scene.keys():
+        scene['compositor_use_nodes'] = not scene.use_nodes
+    scene.use_nodes = True # creates default Render Layers and Composite nodes in a new node tree
+    tree = scene.node_tree
+    render_layers = next((node for node in tree.nodes if node.type == 'R_LAYERS'), None)
+    if render_layers is None:
+        render_layers = tree.nodes.new('CompositorNodeRLayers')
+    if not any(node.type == 'COMPOSITE' for node in tree.nodes): # without a Composite node the compositor does not run
+        composite = tree.nodes.new('CompositorNodeComposite')
+        tree.links.new(render_layers.outputs['Image'], composite.inputs[0])
+    created = list(scene.get('compositor_nodes', [])) + [name for name in tree.nodes.keys() if name not in existing_nodes]
+    scene['compositor_nodes'] = created
+    remove_compositor_outputs(scene)
+
+    # Blender renders premultiplied linear colour, alpha over black composites in linear space like alpha_composite_linear
+    alpha_over = tree.nodes.new('CompositorNodeAlphaOver')
+    alpha_over.name = 'PlenoAlphaOver'
+    alpha_over.inputs[1].default_value = (0.0, 0.0, 0.0, 1.0)
+    tree.links.new(render_layers.outputs['Image'], alpha_over.inputs[2])
+
+    threshold = tree.nodes.new('CompositorNodeMath')
+    threshold.name = 'PlenoThreshold'
+    threshold.operation = 'GREATER_THAN'
+    threshold.inputs[1].default_value = 0.5 / 255 # alpha values that round to 0 in an 8-bit PNG are background
+    tree.links.new(render_layers.outputs['Alpha'], threshold.inputs[0])
+
+    for folder, source, color_mode in (('ims', alpha_over.outputs[0], 'RGB'), ('seg', threshold.outputs[0], 'BW')):
+        file_output = tree.nodes.new('CompositorNodeOutputFile')
+        file_output.name = compositor.COMPOSITOR_NODES[folder]
+        file_output.format.file_format = 'PNG'
+        file_output.format.color_mode = color_mode
+        file_output.format.color_depth = '8'
+        file_output.file_slots[0].path = '######' # frame number, as in alpha_ims/
+        tree.links.new(source, file_output.inputs[0])
+    # masks must stay 0 or 1, whatever the scene's view transform
+    mask_format = tree.nodes[compositor.COMPOSITOR_NODES['seg']].format
+    mask_format.color_management = 'OVERRIDE'
+    mask_format.view_settings.view_transform = 'Standard'
+    return
+
+def remove_compositor_outputs(scene):
+    if scene.node_tree is None:
+        return
+    for name in list(compositor.COMPOSITOR_NODES.values()) + ['PlenoAlphaOver', 'PlenoThreshold']:
+        node = scene.node_tree.nodes.get(name)
+        if node is not None:
+            scene.node_tree.nodes.remove(node)
+
+def restore_compositor(scene):
+    '''Remove the compositor outputs, and the nodes and use_nodes setting that setup_compositor_outputs added to the user's compositor.'''
+    remove_compositor_outputs(scene)
+    if scene.node_tree is not None:
+        for name in scene.get('compositor_nodes', []):
+            node = scene.node_tree.nodes.get(name)
+            if node is not None:
+                scene.node_tree.nodes.remove(node)
+    if scene.get('compositor_use_nodes', False):
+        scene.use_nodes = False
+    for key in ('compositor_nodes', 'compositor_use_nodes'):
+        if key in scene.keys():
+            del scene[key]
+
+def set_compositor_paths(scene, directory):
+    '''Point the compositor outputs at <directory>/ims/ and <directory>/seg/, images are moved into camera folders like alpha_ims/.'''
+    for folder, node_name in compositor.COMPOSITOR_NODES.items():
+        scene.node_tree.nodes[node_name].base_path = os.path.join(directory, folder, '')
+        os.makedirs(os.path.join(directory, folder), exist_ok=True)
+
+## timing and memory statistics of an export, written to stats.json next to log.txt
+
+STATS = {'stages': {}, 'render': []}
+RENDER_PROGRESS = {'done': 0, 'total': 0, 'eta': None, 'failed': None} # shown in the panel while rendering
+stats_directory = None
+stats_lock = threading.Lock() # the parallel scheduler records renders from its own thread
+stats_saved = 0.0
+render_start = None
+
+def peak_rss_mb():
+    '''Peak resident memory of this process so far, None where the resource module is not available (Windows).'''
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10 # bytes on macOS, kilobytes on Linux
+
+def reset_stats(directory, total_images):
+    global stats_directory
+    stats_directory = directory
+    STATS['stages'] = {}
+    STATS['render'] = []
+    STATS.pop('failed', None)
+    RENDER_PROGRESS.update(done=0, total=total_images, eta=None, failed=None)
+
+@contextlib.contextmanager
+def timed_stage(name):
+    '''
+    Record the wall time and the peak memory (of the whole process, so far) of an export stage.
+    Yields the stage record, to which the caller can add details.
+    '''
+    record = {}
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record.update(seconds=time.perf_counter() - start, peak_rss_mb=peak_rss_mb())
+        STATS['stages'][name] = record
+        save_stats()
+
+def record_render(frame, cams, seconds):
+    '''
+    Record one render: a frame with all views in multiview mode, a single view with the camera rig, or a job of a render worker.
+    Updates the rolling ETA from the time per image of the last renders, and saves stats.json at most every 10 seconds.
+    '''
+    with stats_lock:
+        STATS['render'].append({'frame': frame, 'cams': list(cams), 'seconds': seconds})
+        RENDER_PROGRESS['done'] += len(cams)
+        recent = STATS['render'][-20:]
+        seconds_per_image = sum(record['seconds'] for record in recent) / sum(len(record['cams']) for record in recent)
+        RENDER_PROGRESS['eta'] = seconds_per_image * max(RENDER_PROGRESS['total'] - RENDER_PROGRESS['done'], 0)
+    if time.perf_counter() - stats_saved > 10:
+        save_stats()
+    if threading.current_thread() is threading.main_thread() and not bpy.app.background:
+        for window in bpy.context.window_manager.windows: # redraw the panel with the new ETA
+            for area in window.screen.areas:
+                if area.type == 'VIEW_3D':
+                    area.tag_redraw()
+
+def record_render_failure(message):
+    '''Mark the render as failed, in stats.json and in the panel.'''
+    with stats_lock:
+        STATS['failed'] = message
+        RENDER_PROGRESS['failed'] = message
+
+def save_stats():
+    global stats_saved
+    if stats_directory is None:
+        return
+    with stats_lock:
+        renders = list(STATS['render'])
+        render_seconds = sum(record['seconds'] for record in renders)
+        images = sum(len(record['cams']) for record in renders)
+        data = {
+            'stages': dict(STATS['stages']),
+            'render': {'images': images, 'seconds': render_seconds, 'seconds_per_image': render_seconds / images if images else None, 'renders': renders},
+        }
+        if 'failed' in STATS:
+            data['render']['failed'] = STATS['failed']
+        stats_saved = time.perf_counter()
+    save_json(stats_directory, 'stats.json', data)
+
+# time every frame of the add-on's multiview render (all views of a frame are rendered in one go)
+@persistent
+def render_timing_pre(scene, *args):
+    global render_start
+    if scene.rendering:
+        render_start = time.perf_counter()
+
+@persistent
+def render_timing_post(scene, *args):
+    global render_start
+    if scene.rendering and render_start is not None:
+        record_render(scene.frame_current, range(len(scene['cam_handles'])), time.perf_counter() - render_start)
+        render_start = None
+
 ## two way property link between sphere and ui (property and handler functions)
 # https://blender.stackexchange.com/questions/261174/2-way-property-link-or-a-filtered-property-display
 
 def properties_ui_upd(self, context):
     can_scene_upd(self, context)
 
+# time spent in the depsgraph handler, print helper.HANDLER_STATS from the Python console to inspect it
+HANDLER_STATS = {'calls': 0, 'syncs': 0, 'seconds': 0.0}
 @persistent
-def properties_desgraph_upd(scene):
-    can_properties_upd(scene)
+def properties_desgraph_upd(scene, depsgraph=None):
+    if suspend_depth or scene.rendering:
+        return
+    start = time.perf_counter()
+    HANDLER_STATS['calls'] += 1
+    # only sync when the sphere itself was updated (or deleted), not on every frame change or unrelated edit
+    sphere = scene.objects.get(SPHERE_NAME)
+    if sphere is None or depsgraph is None or any(update.id.original == sphere for update in depsgraph.updates):
+        HANDLER_STATS['syncs'] += 1
+        can_properties_upd(scene)
+    HANDLER_STATS['seconds'] += time.perf_counter() - start
 
 def properties_ui(self, context):
     scene = context.scene
@@ -417,19 +1200,22 @@ def properties_ui(self, context):
 # if empty sphere modified outside of ui panel, edit panel properties
 def properties_desgraph(scene):
     if scene.show_sphere and SPHERE_NAME in scene.objects.keys():
-        upd_off()
-        scene.sphere_location = bpy.data.objects[SPHERE_NAME].location
-        scene.sphere_rotation = bpy.data.objects[SPHERE_NAME].rotation_euler
-        scene.sphere_scale = bpy.data.objects[SPHERE_NAME].scale
-        scene.sphere_radius = bpy.data.objects[SPHERE_NAME].empty_display_size
-        upd_on()
+        sphere = bpy.data.objects[SPHERE_NAME]
+        sphere_props = (tuple(sphere.location), tuple(sphere.rotation_euler), tuple(sphere.scale), sphere.empty_display_size)
+        if sphere_props != (tuple(scene.sphere_location), tuple(scene.sphere_rotation), tuple(scene.sphere_scale), scene.sphere_radius): # writing triggers another update
+            upd_off()
+            scene.sphere_location = sphere.location
+            scene.sphere_rotation = sphere.rotation_euler
+            scene.sphere_scale = sphere.scale
+            scene.sphere_radius = sphere.empty_display_size
+            upd_on()
 
 
     if SPHERE_NAME not in scene.objects.keys() and scene.sphere_exists:
         scene.show_sphere = False
         scene.sphere_exists = False
 
-def empty_fn(self, context): pass
+def empty_fn(*args): pass
 
 can_scene_upd = properties_ui
 can_properties_upd = properties_desgraph
@@ -443,10 +1229,15 @@ def upd_on():
     can_scene_upd = properties_ui
     can_properties_upd = properties_desgraph
 
+def camera_image_path(directory, camera_num, frame_num, file_extension):
+    '''Final location of a rendered image: <directory>/alpha_ims/<camera>/<frame>.<ext>'''
+    return os.path.join(directory, 'alpha_ims', str(camera_num), f"{frame_num:06d}.{file_extension}")
+
 def organise_folder_structure(directory):
     ''' 
     Organise the output folder structure.
     Follows the structure from Dynamic 3D Gaussians.
+    Images are normally moved frame by frame while rendering (see organise_rendered_frame), this catches anything left over.
     '''
     # find all files ending in png jpg jpeg
     file_extension = bpy.context.scene.render.image_settings.file_format.lower()
@@ -461,20 +1252,35 @@ def organise_folder_structure(directory):
             camera_num = int(camera_str)
 
             # Create camera folder if it doesn't exist
-            camera_folder = os.path.join(directory, 'alpha_ims', str(camera_num))
-            os.makedirs(camera_folder, exist_ok=True)
+            new_path = camera_image_path(directory, camera_num, frame_num, file_extension)
+            os.makedirs(os.path.dirname(new_path), exist_ok=True)
 
             current_path = os.path.join(directory, image)
-            new_path = os.path.join(camera_folder, f"{frame_num:06d}.{file_extension}")
             shutil.move(current_path, new_path)
     return
 
+# move the views of each frame into their camera folders as soon as the frame is written
+@persistent
+def organise_rendered_frame(scene):
+    if scene.rendering: # execute this function only when rendering with addon
+        directory = bpy.path.abspath(scene.render.filepath)
+        frame_num = scene.frame_current
+        file_extension = scene.render.image_settings.file_format.lower()
+
+        for camera_num, (cam_handle, _) in enumerate(scene['cam_handles']):
+            current_path = scene.render.frame_path(frame=frame_num, view=cam_handle)
+            if os.path.exists(current_path):
+                os.replace(current_path, camera_image_path(directory, camera_num, frame_num, file_extension))
+        if compositor.has_compositor_outputs(scene):
+            compositor.move_compositor_outputs(scene, directory, frame_num, [(camera_num, cam_handle) for camera_num, (cam_handle, _) in enumerate(scene['cam_handles'])])
+
 # reset properties back to intial
 @persistent
 def post_render(scene):
     if scene.rendering: # execute this function only when rendering with addon
 
         organise_folder_structure(scene.render.filepath) # organise folder structure into subfolders
+        save_stats()
 
         dataset_name = scene.dataset_name
         # do some clean up of the scene here if you want
@@ -492,6 +1298,8 @@ def post_render(scene):
 # set initial property values (bpy.data and bpy.context require a loaded scene)
 @persistent
 def set_init_props(scene):
+    if suspend_depth: # wait for the first update outside of the add-on's own frame sweeps
+        return
     filepath = bpy.data.filepath
     filename = bpy.path.basename(filepath)
     default_save_path = filepath[:-len(filename)] # remove file name from blender file path = directoy path
@@ -500,4 +1308,13 @@ def set_init_props(scene):
     scene.init_frame_step = scene.frame_step
     scene.init_output_path = scene.render.filepath
 
-    bpy.app.handlers.depsgraph_update_post.remove(set_init_props)
\ No newline at end of file
+    bpy.app.handlers.depsgraph_update_post.remove(set_init_props)
+
+# opening another .blend file: initialise its save path again and sync the panel with its sphere
+@persistent
+def load_post_handler(*args):
+    if set_init_props not in bpy.app.handlers.depsgraph_update_post:
+        bpy.app.handlers.depsgraph_update_post.append(set_init_props)
+    scene = bpy.context.scene
+    if scene is not None:
+        can_properties_upd(scene)
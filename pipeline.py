@@ -0,0 +1,101 @@
+'''
+Headless entry point: prepare a scene, export the metadata and render a dataset without the UI.
+    blender -b scene.blend --python pipeline.py -- config.toml [more_configs.toml ...]
+Each config file (TOML or JSON) sets add-on properties by the names used in PROPS (see __init__.py), for example:
+    save_path = "/data/datasets/"
+    dataset_name = "walk_01"
+    nb_cameras = 30
+    final_frame_nr = 48
+    cam_distribution = true
+Three extra keys are supported: camera (name of the template camera object, defaults to the scene camera),
+render (false to only export the metadata) and reset (false to keep an existing camera setup, default true).
+With several config files, the .blend file is reloaded before each one, so every dataset starts from the same scene.
+'''
+import bpy
+import os
+import sys
+import json
+import importlib
+
+try:
+    import tomllib
+except ImportError: # Python < 3.11
+    tomllib = None
+
+# properties set by the add-on itself, or only meaningful in the UI
+AUTOMATIC_PROPS = ['init_frame_step', 'init_output_path', 'rendering', 'plenoblendernerf_version', 'sphere_exists', 'init_sphere_exists', 'focal_length', 'show_sphere']
+PIPELINE_KEYS = ['camera', 'render', 'reset']
+
+def load_addon():
+    '''
+    Returns the add-on package, registering it without its UI handlers if it is not enabled in this Blender instance.
+    '''
+    for module in list(sys.modules.values()):
+        if getattr(module, 'bl_info', {}).get('name') == 'PlenoBlenderNeRF' and hasattr(module, 'PROPS'):
+            break
+    else:
+        addon_dir = os.path.dirname(os.path.abspath(__file__))
+        sys.path.insert(0, os.path.dirname(addon_dir))
+        module = importlib.import_module(os.path.basename(addon_dir))
+        module.register(headless=True)
+
+    # an add-on enabled from the preferences has registered UI handlers, which would overwrite the configured save path
+    # (the load_post handler would add set_init_props again after every revert_mainfile between configs)
+    for handler in (module.helper.properties_desgraph_upd, module.helper.set_init_props):
+        if handler in bpy.app.handlers.depsgraph_update_post:
+            bpy.app.handlers.depsgraph_update_post.remove(handler)
+    if module.helper.load_post_handler in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(module.helper.load_post_handler)
+    return module
+
+def load_config(path):
+    if path.endswith('.toml'):
+        if tomllib is None:
+            raise RuntimeError('TOML configs require Python 3.11 or newer, use a JSON config instead')
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def apply_config(scene, config, addon):
+    prop_names = [prop_name for prop_name, _ in addon.PROPS if prop_name not in AUTOMATIC_PROPS]
+    unknown = [key for key in config if key not in prop_names + PIPELINE_KEYS]
+    if unknown:
+        raise ValueError(f"Unknown config keys {unknown}, expected any of {prop_names + PIPELINE_KEYS}")
+
+    for key, value in config.items():
+        if key in prop_names:
+            setattr(scene, key, value)
+    if 'camera' in config:
+        scene.camera = bpy.data.objects[config['camera']]
+
+def run(config, addon):
+    scene = bpy.context.scene
+    if config.get('reset', True) and 'cam_handles' in scene.keys():
+        bpy.ops.object.scene_reset()
+    apply_config(scene, config, addon)
+
+    if scene.camera is None:
+        raise ValueError('The scene has no camera, set one with the camera key')
+    error_messages = addon.helper.asserts(scene)
+    if error_messages:
+        raise ValueError(error_messages[0])
+
+    bpy.ops.object.scene_prep()
+    bpy.ops.object.renderer(render_images=config.get('render', True))
+
+def main():
+    config_paths = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    if not config_paths:
+        raise SystemExit('Usage: blender -b scene.blend --python pipeline.py -- config.toml [more_configs.toml ...]')
+
+    addon = load_addon()
+    for i, config_path in enumerate(config_paths):
+        if i > 0:
+            bpy.ops.wm.revert_mainfile() # start every dataset from the saved scene
+        print(f"PlenoBlenderNeRF pipeline: {config_path}")
+        run(load_config(config_path), addon)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import bpy
+from . import helper
 
 # plenoptic video ui class
 class PLENO_UI(bpy.types.Panel):
@@ -19,11 +20,22 @@ class PLENO_UI(bpy.types.Panel):
         layout.use_property_split = True
         layout.prop(scene, 'aabb')
         layout.prop(scene, 'splats', text='Gaussian Points (PLY file)')
+        layout.prop(scene, 'init_point_cloud', text='Dense Initial Point Cloud')
+        if scene.init_point_cloud:
+            layout.prop(scene, 'init_point_cloud_size')
+        layout.prop(scene, 'compositor_outputs', text='Masks and Composites')
+        layout.prop(scene, 'binary_metadata', text='Binary Metadata (.npy)')
+        layout.prop(scene, 'ply_ascii', text='ASCII PLY Files')
         layout.prop(scene, 'export_meshes_per_frame', text='Export Meshes Per Frame')
+        if scene.export_meshes_per_frame:
+            layout.prop(scene, 'mesh_export_format')
         layout.prop(scene, 'track_vertex_trajectories', text='Track Vertex Trajectories')
+        if scene.track_vertex_trajectories:
+            layout.prop(scene, 'trajectory_format')
         row = layout.row(align=True)
         row.prop(scene, 'coordinate_frame', toggle=True, text='NeRF', invert_checkbox=True)
         row.prop(scene, 'coordinate_frame', toggle=True, text='OpenCV')
+        layout.prop(scene, 'depsgraph_extrinsics', text='Depsgraph Extrinsics')
 
         layout.separator()
         layout.use_property_split = True
@@ -49,7 +61,19 @@ class PLENO_UI(bpy.types.Panel):
         row = layout.row(align=True)
         row.prop(scene, 'cam_distribution', toggle=True, text='per-frame', invert_checkbox=True)
         row.prop(scene, 'cam_distribution', toggle=True, text='static')
+        if not scene.cam_distribution:
+            layout.prop(scene, 'legacy_cam_sampling')
 
+        layout.prop(scene, 'virtual_rig')
         layout.operator('object.scene_prep', text='SET UP SCENE')
         layout.operator('object.scene_reset', text='RESET SCENE')
+        layout.prop(scene, 'render_workers')
+        layout.prop(scene, 'resume_render', text='Resume Interrupted Render')
         layout.operator('object.renderer', text='RENDER')
+
+        progress = helper.RENDER_PROGRESS
+        if 0 < progress['done'] < progress['total'] and progress['eta'] is not None:
+            minutes, seconds = divmod(int(progress['eta']), 60)
+            layout.label(text=f"Rendered {progress['done']}/{progress['total']} images, ETA {minutes // 60}:{minutes % 60:02d}:{seconds:02d}")
+        if progress['failed'] is not None:
+            layout.label(text=f"Render failed, {progress['done']}/{progress['total']} images rendered. Resume to retry.", icon='ERROR')
@@ -1,23 +1,157 @@
 import bpy
 import os
+import threading
 import numpy as np
-from . import helper
+from . import helper, compositor, render_scheduler, render_worker
 
 class RenderScene(bpy.types.Operator):
     '''Plenoptic Video Scene Rendering Operator'''
     bl_idname = 'object.renderer'
     bl_label = 'Plenoptic Video Renderer'
 
+    render_images: bpy.props.BoolProperty(name='Render Images', description='Whether to render the images after exporting the metadata', default=True)
+
     def render(self, scene, output_path):
         scene.rendering = True
         scene.render.filepath = os.path.join(output_path, '') # frames path
-        bpy.ops.render.render('INVOKE_DEFAULT', animation=True, write_still=True) # render scene
+        for camera_num in range(len(scene['cam_handles'])): # images are moved into their camera folders as they are written
+            os.makedirs(os.path.join(output_path, 'alpha_ims', str(camera_num)), exist_ok=True)
+        if bpy.app.background:
+            bpy.ops.render.render(animation=True, write_still=True) # render scene, blocking when running headless
+        else:
+            bpy.ops.render.render('INVOKE_DEFAULT', animation=True, write_still=True) # render scene
         return 'FINISHED'
     
-    def write_metadata(self, scene, output_path):
+    def render_rig(self, scene, output_path):
+        '''
+        Render with the single camera rig in this Blender instance, one frame at a time: the rig camera is moved to every pose
+        of the frame and each view is rendered as a still image straight into alpha_ims/<camera>/.
+        In the UI, frames are rendered from a timer so the interface is updated in between (blocking when headless).
+        '''
+        output_path = bpy.path.abspath(output_path)
+        poses = render_worker.load_rig_poses(scene)
+        jobs = render_scheduler.make_jobs(scene.first_frame_nr, scene.final_frame_nr, len(scene['cam_handles']))
+
+        def render_next_frame():
+            job = jobs.pop(0)
+            with helper.handlers_suspended():
+                render_worker.render_rig_job(scene, poses, output_path, job['frame'], job['cams'], lambda frame, cam, seconds: helper.record_render(frame, [cam], seconds))
+            print(f"Rendered frame {job['frame']}")
+            if jobs:
+                return 0.0 # run again as soon as possible
+            scene.render.filepath = scene.init_output_path # reset filepath
+            helper.save_stats()
+            print("Rig rendering finished")
+            return None
+
+        if bpy.app.background:
+            while render_next_frame() is not None:
+                pass
+        else:
+            bpy.app.timers.register(render_next_frame)
+        return 'FINISHED'
+
+    def render_parallel(self, scene, output_path, jobs=None):
+        '''
+        Render with one or more headless Blender processes working on a saved copy of the prepared scene.
+        Renders the whole (frame, camera) grid unless a list of jobs ({'frame': frame, 'cams': [camera numbers]}) is given.
+        The scheduler runs in a background thread so the UI stays responsive (blocking when headless), the images end up in the same layout as with render().
+        Jobs whose worker crashed are retried once. If some still fail, the error is reported in the UI and the missing images can be rendered with 'Resume Interrupted Render'.
+        '''
+        output_path = bpy.path.abspath(output_path)
+        blend_file = os.path.join(output_path, 'render_scene.blend')
+        bpy.ops.wm.save_as_mainfile(filepath=blend_file, copy=True)
+        num_workers = scene.render_workers # read here, bpy data must not be accessed from the scheduler thread
+
+        if jobs is None:
+            num_frames = scene.final_frame_nr - scene.first_frame_nr + 1
+            num_cameras = len(scene['cam_handles'])
+            cams_per_job = render_scheduler.default_cams_per_job(num_frames, num_cameras, num_workers)
+            jobs = render_scheduler.make_jobs(scene.first_frame_nr, scene.final_frame_nr, num_cameras, cams_per_job)
+
+        def report_failure(error):
+            def draw(menu, context):
+                menu.layout.label(text=str(error)[:200])
+                menu.layout.label(text="Tick 'Resume Interrupted Render' and render again to retry the missing images.")
+            bpy.context.window_manager.popup_menu(draw, title='Parallel rendering failed', icon='ERROR')
+            return None # run once
+
+        def run():
+            try:
+                render_scheduler.schedule_render(blend_file, output_path, jobs, num_workers, bpy.app.binary_path,
+                                                 on_job_done=lambda job, seconds: helper.record_render(job['frame'], job['cams'], seconds))
+                print("Parallel rendering finished")
+            except RuntimeError as error:
+                print(f"Parallel rendering failed: {error}")
+                helper.record_render_failure(str(error))
+                if bpy.app.background:
+                    raise
+                bpy.app.timers.register(lambda: report_failure(error)) # the UI can only be updated from the main thread
+            finally:
+                os.remove(blend_file)
+                helper.save_stats()
+
+        if bpy.app.background:
+            run() # block, otherwise a headless Blender would exit while the workers are still rendering
+        else:
+            threading.Thread(target=run, daemon=True).start()
+        return 'FINISHED'
+
+    def export_up_to_date(self, scene, output_path, stage, outputs):
+        '''
+        In resume mode, whether an export stage already ran with the same inputs and all of its outputs still exist.
+        '''
+        if not scene.resume_render:
+            return False
+        output_path = bpy.path.abspath(output_path)
+        fingerprint = self.fingerprints[stage]
+        if fingerprint is None or helper.load_export_state(output_path).get(stage) != fingerprint:
+            return False
+        if all(os.path.exists(os.path.join(output_path, output)) for output in outputs):
+            print(f"Skipping {stage} export, its outputs are up to date")
+            return True
+        return False
+
+    def record_export(self, scene, output_path, stage):
+        output_path = bpy.path.abspath(output_path)
+        state = helper.load_export_state(output_path)
+        state[stage] = self.fingerprints[stage]
+        helper.save_json(output_path, helper.EXPORT_STATE_FILE, state)
+
+    def resume(self, scene, output_path):
+        '''
+        Render only the (frame, view) images that are missing or corrupt in alpha_ims/ (or in ims/ and seg/ with compositor outputs).
+        '''
+        output_path = bpy.path.abspath(output_path)
+        helper.organise_folder_structure(output_path) # sort images left behind by an interrupted render first
+        missing = helper.find_missing_renders(scene, output_path)
+        if not missing:
+            print("All images have already been rendered")
+            self.report({'INFO'}, "All images have already been rendered")
+            return 'FINISHED'
+
+        jobs = [{'frame': frame, 'cams': cams} for frame, cams in missing.items()]
+        helper.RENDER_PROGRESS['total'] = sum(len(job['cams']) for job in jobs)
+        print(f"Resuming render: {sum(len(job['cams']) for job in jobs)} images in {len(jobs)} frames are missing")
+        self.report({'INFO'}, f"Resuming render of {sum(len(job['cams']) for job in jobs)} missing images")
+        return self.render_parallel(scene, output_path, jobs)
+
+    def needs_depsgraph_extrinsics(self, scene):
+        '''Whether the extrinsics have to be read from the evaluated scene instead of being computed from the cached camera positions.'''
+        if 'rig_camera' in scene.keys(): # the rig camera only has the right pose while rendering
+            return False
+        return scene.depsgraph_extrinsics or helper.get_cached_cam_positions(scene) is None
+
+    def write_metadata(self, scene, output_path, extrinsics=None):
+        '''
+        Write meta.json (and the binary metadata), using extrinsics already read during the frame sweep if given.
+        '''
         intrinsics = helper.get_camera_intrinsics(scene, scene.objects[scene['cam_handles'][0][1]]) # intrinsics are the same for all cameras
         camera_matrix = np.array([[intrinsics['fl_x'], 0, intrinsics['cx']], [0, intrinsics['fl_y'], intrinsics['cy']], [0, 0, 1]])
-        extrinsics = helper.get_camera_extrinsics(scene, scene['cam_handles'])
+        if extrinsics is None and self.needs_depsgraph_extrinsics(scene):
+            extrinsics = helper.get_camera_extrinsics(scene, scene['cam_handles']) # slow fallback, steps through every frame
+        elif extrinsics is None:
+            extrinsics = helper.get_camera_extrinsics_analytic(scene, scene['cam_handles'])
         nr_frames = scene.final_frame_nr - scene.first_frame_nr + 1
 
         frame_ids = [str(number+1).zfill(6) for number in range(nr_frames)]
@@ -33,6 +167,8 @@ class RenderScene(bpy.types.Operator):
         meta_data['cam_id'] = [[int(index) for index in range(scene.nb_cameras)] for _ in range(nr_frames)]
 
         helper.save_json(output_path, 'meta.json', meta_data)
+        if scene.binary_metadata:
+            helper.save_binary_metadata(os.path.join(output_path, 'meta'), intrinsics['w'], intrinsics['h'], camera_matrix, extrinsics, scene.render.image_settings.file_format.lower())
 
     def execute(self, context):
         scene = context.scene
@@ -42,43 +178,96 @@ class RenderScene(bpy.types.Operator):
         output_path = os.path.join(scene.save_path, output_dir)
         os.makedirs(output_path, exist_ok=True)
         
+        # fingerprint the export inputs before the exports themselves touch the scene
+        self.fingerprints = {stage: helper.export_fingerprint(scene, stage) for stage in helper.EXPORT_SETTINGS}
+        # stage timings and render times are written to stats.json
+        helper.reset_stats(bpy.path.abspath(output_path), (scene.final_frame_nr - scene.first_frame_nr + 1) * len(scene['cam_handles']))
+
         # Create log file using stored focal length from scene preparation
-        helper.save_log_file(scene, scene.focal_length, output_path)
+        with helper.timed_stage('log'):
+            helper.save_log_file(scene, scene.focal_length, output_path)
                 
          # save PC as PLY file
-        if scene.splats:
-            helper.save_splats_ply(scene, output_path)
+        if scene.splats and not self.export_up_to_date(scene, output_path, 'splats', ['points3d.ply']):
+            with helper.timed_stage('splats'):
+                helper.save_splats_ply(scene, output_path)
+            self.record_export(scene, output_path, 'splats')
+
+        # sample the dense initial point cloud directly, no post-processing needed
+        if scene.init_point_cloud and not self.export_up_to_date(scene, output_path, 'init_point_cloud', ['init_pt_cld.npz']):
+            with helper.timed_stage('init_point_cloud'):
+                helper.save_init_point_cloud(scene, output_path, scene.init_point_cloud_size)
+            self.record_export(scene, output_path, 'init_point_cloud')
 
         # Make sure the correct frames are rendered in case this has changed
         scene.frame_end = scene.final_frame_nr
         scene.frame_start = scene.first_frame_nr
 
-        self.write_metadata(scene, output_path)
+        # all per-frame exports share a single sweep over the animation, evaluating every frame once
+        consumers = []
+        export_metadata = not self.export_up_to_date(scene, output_path, 'metadata', ['meta.json'])
+        camera_poses = None
+        if export_metadata and self.needs_depsgraph_extrinsics(scene):
+            camera_poses = helper.CameraPoses(scene['cam_handles'])
+            consumers.append(camera_poses)
 
         # Additional export options based on user flags (performed after rendering)
-        if scene.export_meshes_per_frame:
-            print("Starting per-frame mesh export...")
-            self.report({'INFO'}, "Starting per-frame mesh export...")
-            ply_path = os.path.join(output_path, 'per_frame_plys')
+        mesh_output = 'per_frame_meshes' if scene.mesh_export_format == 'cached' else 'per_frame_plys'
+        export_meshes = scene.export_meshes_per_frame and not self.export_up_to_date(scene, output_path, 'meshes', [mesh_output])
+        if export_meshes:
+            ply_path = os.path.join(output_path, mesh_output)
             if not os.path.exists(ply_path):
                 os.mkdir(ply_path)
-            helper.save_meshes_per_frame(scene, ply_path)
-            # This should export .ply meshes for each frame of the animation
-            print("Per-frame mesh export completed")
-            self.report({'INFO'}, "Per-frame mesh export completed")
-            
-        if scene.track_vertex_trajectories:
-            print("Starting vertex trajectory tracking...")
-            self.report({'INFO'}, "Starting vertex trajectory tracking...")
-            helper.track_vertices(scene, os.path.join(output_path, 'gt_traj.json'))
-            # This should track and export trajectories of all mesh vertices
-            print("Vertex trajectory tracking completed")
-            self.report({'INFO'}, "Vertex trajectory tracking completed")
+            consumers.append(helper.CachedMeshes(ply_path) if scene.mesh_export_format == 'cached' else helper.PlyMeshes(ply_path))
+
+        trajectory_output = 'gt_traj' if scene.trajectory_format == 'dense' else 'gt_traj.json'
+        export_trajectories = scene.track_vertex_trajectories and not self.export_up_to_date(scene, output_path, 'trajectories', [trajectory_output])
+        if export_trajectories:
+            if scene.trajectory_format == 'dense':
+                consumers.append(helper.DenseVertexTrajectories(os.path.join(output_path, 'gt_traj')))
+            else:
+                consumers.append(helper.VertexTrajectories(os.path.join(output_path, 'gt_traj.json')))
+
+        if consumers:
+            stages = ', '.join(consumer.stage for consumer in consumers)
+            print(f"Starting per-frame export ({stages})...")
+            self.report({'INFO'}, f"Starting per-frame export ({stages})...")
+            with helper.timed_stage('frame_sweep') as stage:
+                stage['breakdown'] = helper.sweep_frames(scene, consumers)
+            print("Per-frame export completed")
+            self.report({'INFO'}, "Per-frame export completed")
+
+        if export_metadata:
+            with helper.timed_stage('metadata'):
+                self.write_metadata(scene, output_path, None if camera_poses is None else camera_poses.extrinsics)
+            self.record_export(scene, output_path, 'metadata')
+        if export_meshes:
+            self.record_export(scene, output_path, 'meshes')
+        if export_trajectories:
+            self.record_export(scene, output_path, 'trajectories')
+
+        if not self.render_images:
+            print("Metadata export completed, skipping rendering")
+            return {'FINISHED'}
 
         # Start main rendering process
         print("Starting main rendering process...")
         self.report({'INFO'}, "Starting main rendering process...")
-        self.render(scene, output_path) # RENDER SCENE
+        if compositor.has_compositor_outputs(scene):
+            helper.set_compositor_paths(scene, bpy.path.abspath(output_path))
+        if 'rig_camera' in scene.keys():
+            rig_poses = helper.get_rig_poses(scene) # pose table, also read by the render workers
+            scene['rig_poses'] = rig_poses.ravel().tolist()
+            scene['rig_poses_shape'] = list(rig_poses.shape)
+
+        if scene.resume_render:
+            self.resume(scene, output_path) # RENDER only the missing images
+        elif scene.render_workers > 1:
+            self.render_parallel(scene, output_path) # RENDER SCENE in separate Blender processes
+        elif 'rig_camera' in scene.keys():
+            self.render_rig(scene, output_path) # RENDER SCENE one view at a time with the rig camera
+        else:
+            self.render(scene, output_path) # RENDER SCENE
         
         # Final completion message
         print("All separate export tasks completed successfully! Please wait for the main rendering to finish...")
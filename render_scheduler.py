@@ -0,0 +1,126 @@
+'''
+Local multi-process render scheduler.
+Splits the (frame, camera) grid of a prepared scene into small jobs and renders them with several headless Blender
+instances (render_worker.py) running on a saved copy of the scene. Workers pull a new job as soon as they finish the
+previous one, so the load is rebalanced automatically when some frames render faster than others.
+Does not depend on bpy, so it can also be run as a stand-alone script:
+    python render_scheduler.py scene.blend <output_path> --frames 1 48 --cameras 30 --workers 4
+'''
+import os
+import sys
+import json
+import time
+import math
+import queue
+import argparse
+import threading
+import subprocess
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'render_worker.py')
+DONE_MARKER = 'PLENO_JOB_DONE' # must match render_worker.DONE_MARKER
+
+def make_jobs(first_frame, last_frame, num_cameras, cams_per_job=None):
+    '''
+    Split the (frame, camera) grid into jobs of one frame and up to cams_per_job cameras (default: all cameras).
+    '''
+    cams_per_job = cams_per_job or num_cameras
+    jobs = []
+    for frame in range(first_frame, last_frame + 1):
+        for start in range(0, num_cameras, cams_per_job):
+            jobs.append({'frame': frame, 'cams': list(range(start, min(start + cams_per_job, num_cameras)))})
+    return jobs
+
+def default_cams_per_job(num_frames, num_cameras, num_workers):
+    '''Split the cameras of each frame only when there are fewer frames than workers to keep busy.'''
+    splits = max(1, math.ceil(2 * num_workers / num_frames))
+    return math.ceil(num_cameras / min(splits, num_cameras))
+
+def run_worker(blender, blend_file, output_path, worker_id, jobs, progress, failed):
+    process = subprocess.Popen(
+        [blender, '-b', blend_file, '--python', WORKER_SCRIPT, '--', output_path, str(worker_id)],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1)
+    try:
+        while True:
+            try:
+                job = jobs.get_nowait()
+            except queue.Empty:
+                break
+            start = time.perf_counter()
+            process.stdin.write(json.dumps(job) + '\n')
+            process.stdin.flush()
+            for line in process.stdout: # skip Blender's own output until the job is acknowledged
+                if line.startswith(DONE_MARKER):
+                    progress(job, time.perf_counter() - start)
+                    break
+            else:
+                failed.append(job) # the worker exited before finishing this job
+                break
+        if process.poll() is None:
+            process.stdin.write('null\n')
+            process.stdin.flush()
+    finally:
+        process.stdin.close()
+        process.stdout.close()
+        process.wait()
+
+def schedule_render(blend_file, output_path, jobs, num_workers, blender='blender', on_job_done=None, retries=1):
+    '''
+    Render all jobs with num_workers headless Blender processes.
+    Images end up in the same <output_path>/alpha_ims/<cam>/<frame>.<ext> layout as a regular render.
+    on_job_done(job, seconds) is called from the worker threads after every finished job.
+    Jobs whose worker crashed (and jobs left over when all workers crashed) are rendered again by fresh workers, up to `retries` times.
+    Raises a RuntimeError listing the jobs that could still not be rendered.
+    '''
+    lock = threading.Lock()
+    done = []
+    def progress(job, seconds):
+        with lock:
+            done.append(job)
+            print(f"[{len(done)}/{len(jobs)}] rendered frame {job['frame']}, cameras {job['cams'][0]}-{job['cams'][-1]} in {seconds:.1f} s", flush=True)
+        if on_job_done is not None:
+            on_job_done(job, seconds)
+
+    missing = list(jobs)
+    for attempt in range(retries + 1):
+        if attempt > 0:
+            print(f"Retrying {len(missing)} failed render jobs", flush=True)
+        job_queue = queue.Queue()
+        for job in missing:
+            job_queue.put(job)
+        failed = []
+        threads = [threading.Thread(target=run_worker, args=(blender, blend_file, output_path, worker_id, job_queue, progress, failed)) for worker_id in range(min(num_workers, len(missing)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        missing = failed + list(job_queue.queue)
+        if not missing:
+            break
+
+    shard_root = os.path.join(output_path, '.render_shards')
+    if os.path.isdir(shard_root) and not os.listdir(shard_root):
+        os.rmdir(shard_root)
+
+    if missing:
+        raise RuntimeError(f"{len(missing)} render jobs failed: {missing}")
+    return
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render a prepared PlenoBlenderNeRF scene with several headless Blender processes.')
+    parser.add_argument('blend_file', help='Blender file saved after scene preparation')
+    parser.add_argument('output_path', help='dataset directory, images are written to <output_path>/alpha_ims/')
+    parser.add_argument('--frames', nargs=2, type=int, required=True, metavar=('FIRST', 'LAST'))
+    parser.add_argument('--cameras', type=int, required=True, help='number of cameras in the scene')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--cams-per-job', type=int, default=None)
+    parser.add_argument('--blender', default='blender', help='path to the Blender executable')
+    args = parser.parse_args()
+
+    num_frames = args.frames[1] - args.frames[0] + 1
+    cams_per_job = args.cams_per_job or default_cams_per_job(num_frames, args.cameras, args.workers)
+    try:
+        schedule_render(args.blend_file, args.output_path, make_jobs(*args.frames, args.cameras, cams_per_job), args.workers, args.blender)
+    except RuntimeError as error:
+        print(error, file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,92 @@
+'''
+Render worker for the multi-process render scheduler (see render_scheduler.py).
+This script runs inside a headless Blender instance on a prepared copy of the scene:
+    blender -b scene.blend --python render_worker.py -- <output_path> <worker_id>
+It reads jobs as JSON lines from stdin, e.g. {"frame": 12, "cams": [0, 1, 2]}, renders the requested views of that frame,
+moves the images to <output_path>/alpha_ims/<cam>/<frame>.<ext> and acknowledges every job with a line starting with DONE_MARKER.
+Scenes prepared as a single camera rig are rendered by moving the rig camera through the pose table stored in the scene.
+'''
+import bpy
+import os
+import sys
+import json
+import time
+import numpy as np
+from mathutils import Matrix
+
+if __package__: # imported by the add-on (render_operator.py)
+    from .compositor import COMPOSITOR_NODES, has_compositor_outputs, move_compositor_outputs
+else: # run as a script by a headless Blender instance
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from compositor import COMPOSITOR_NODES, has_compositor_outputs, move_compositor_outputs
+
+DONE_MARKER = 'PLENO_JOB_DONE'
+
+def render_job(scene, output_path, shard_path, frame, cams):
+    cam_handles = scene['cam_handles']
+    views = [cam_handles[cam][0] for cam in cams]
+    for view in scene.render.views:
+        view.use = view.name in views
+
+    # render a one-frame animation into this worker's own folder, so the file naming matches a regular render
+    scene.frame_start = frame
+    scene.frame_end = frame
+    scene.render.filepath = os.path.join(shard_path, '')
+    bpy.ops.render.render(animation=True)
+
+    file_extension = scene.render.image_settings.file_format.lower()
+    for cam, view in zip(cams, views):
+        new_path = os.path.join(output_path, 'alpha_ims', str(cam), f"{frame:06d}.{file_extension}")
+        os.makedirs(os.path.dirname(new_path), exist_ok=True)
+        os.replace(scene.render.frame_path(frame=frame, view=view), new_path)
+    if has_compositor_outputs(scene):
+        move_compositor_outputs(scene, output_path, frame, zip(cams, views))
+
+def load_rig_poses(scene):
+    '''Pose table [repetitions, num_cameras, 4, 4] stored on the scene by RenderScene.render_rig.'''
+    return np.asarray(scene['rig_poses'], dtype=np.float64).reshape(tuple(scene['rig_poses_shape']))
+
+def render_rig_job(scene, poses, output_path, frame, cams, on_rendered=None):
+    '''
+    Render the requested views of one frame with the single rig camera, writing each image straight to its final location.
+    on_rendered(frame, cam, seconds) is called after every view.
+    '''
+    rig_cam = scene.objects[scene['rig_camera']]
+    scene.frame_set(frame)
+    rep = min(frame - scene.first_frame_nr, len(poses) - 1) # static cameras only have one set of poses
+    file_extension = scene.render.image_settings.file_format.lower()
+    for cam in cams:
+        rig_cam.matrix_world = Matrix(poses[rep, cam].tolist())
+        new_path = os.path.join(output_path, 'alpha_ims', str(cam), f"{frame:06d}.{file_extension}")
+        os.makedirs(os.path.dirname(new_path), exist_ok=True)
+        scene.render.filepath = new_path
+        if has_compositor_outputs(scene): # a single view per render, write straight into the camera folders
+            for folder, node_name in COMPOSITOR_NODES.items():
+                scene.node_tree.nodes[node_name].base_path = os.path.join(output_path, folder, str(cam), '')
+        start = time.perf_counter()
+        bpy.ops.render.render(write_still=True)
+        if on_rendered is not None:
+            on_rendered(frame, cam, time.perf_counter() - start)
+
+def main():
+    output_path, worker_id = sys.argv[sys.argv.index('--') + 1:][:2]
+    shard_path = os.path.join(output_path, '.render_shards', worker_id)
+    os.makedirs(shard_path, exist_ok=True)
+    scene = bpy.context.scene
+    poses = load_rig_poses(scene) if 'rig_camera' in scene.keys() else None
+
+    for line in sys.stdin:
+        job = json.loads(line)
+        if job is None: # no more work
+            break
+        if poses is not None:
+            render_rig_job(scene, poses, output_path, job['frame'], job['cams'])
+        else:
+            render_job(scene, output_path, shard_path, job['frame'], job['cams'])
+        print(DONE_MARKER, json.dumps(job), flush=True)
+
+    os.rmdir(shard_path)
+
+
+if __name__ == '__main__':
+    main()
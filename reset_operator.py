@@ -1,8 +1,11 @@
 import bpy
 
-# global addon script variables
+from . import helper
+
+# global addon script variables
 SPHERE_NAME = 'PlenoSphere'
 TMP_VERTEX_COLORS = 'plenoblendernerf_vertex_colors_tmp'
+SCENE_KEYS = ['cam_handles', 'cam_positions', 'cam_positions_shape', 'rig_camera', 'rig_poses', 'rig_poses_shape'] # custom scene properties written by the add-on
 
 class ResetScene(bpy.types.Operator):
     '''Plenoptic Video Scene Reset Operator'''
@@ -13,25 +16,60 @@ class ResetScene(bpy.types.Operator):
     def execute(self, context):
         '''
         Reset the scene so that the scene can be set-up again from the GUI.
+        Everything the scene preparation created (cameras and their data, keyframe actions, render views, the PlenoSphere)
+        is removed in one batch, except for the first camera, which becomes the new template camera.
         '''
-        camera_list = sorted([obj.name for obj in bpy.data.objects if obj.type == 'CAMERA']) # names of all camera objects
-        view_names = context.scene.render.views.keys() # names of all render views registered for multiview rendering
-        
+        scene = context.scene
+        owned = helper.owned_data_blocks()
+
+        # scenes prepared before data blocks were tagged: fall back to the recorded camera names
+        if 'cam_handles' in scene.keys():
+            for _, name in scene['cam_handles']:
+                obj = bpy.data.objects.get(name)
+                if obj is not None and obj not in owned:
+                    owned.extend([obj, obj.data])
+                    if obj.animation_data is not None and obj.animation_data.action is not None:
+                        owned.append(obj.animation_data.action)
+
+        view_names = scene.render.views.keys() # names of all render views registered for multiview rendering
+
         # remove all cameras from the multiview rendering menu (except the first one)
         for view in view_names[1:]:
-            obj = context.scene.render.views.get(view)
+            obj = scene.render.views.get(view)
             if view in self.default_cam_handles:
                 obj.camera_suffix = ""
             else:
-                context.scene.render.views.remove(obj) # remove all render views except the first two that are normally there by default
-        
-        new_template_cam = context.scene.objects[camera_list[0]]
-        new_template_cam.name = 'Camera'
-        context.scene.camera = new_template_cam # keep the first camera as a new template
-        context.scene.render.use_multiview = False # disable multiview rendering again
-
-        for camera in camera_list[1:]:
-            bpy.data.objects.remove(bpy.data.objects[camera], do_unlink=True)
+                scene.render.views.remove(obj) # remove all render views except the first two that are normally there by default
+        scene.render.use_multiview = False # disable multiview rendering again
+
+        # keep the first camera as a new template
+        cameras = [data_block for data_block in owned if isinstance(data_block, bpy.types.Object) and data_block.type == 'CAMERA']
+        if 'cam_handles' in scene.keys() and scene['cam_handles'][0][1] in bpy.data.objects:
+            new_template_cam = bpy.data.objects[scene['cam_handles'][0][1]]
+        else:
+            new_template_cam = cameras[0] if cameras else None
+        if new_template_cam is not None:
+            new_template_cam.animation_data_clear()
+            new_template_cam.constraints.clear()
+            for data_block in (new_template_cam, new_template_cam.data):
+                if data_block in owned:
+                    owned.remove(data_block)
+                if helper.OWNER_KEY in data_block.keys():
+                    del data_block[helper.OWNER_KEY]
+            new_template_cam.name = 'Camera'
+            new_template_cam.data.name = 'Camera'
+            scene.camera = new_template_cam
+
+        sphere_removed = any(data_block.name == SPHERE_NAME for data_block in owned if isinstance(data_block, bpy.types.Object))
+        bpy.data.batch_remove(owned)
+        if sphere_removed:
+            scene.show_sphere = False # same order as in properties_desgraph, so the sphere is not created again
+            scene.sphere_exists = False
+
+        helper.restore_compositor(scene)
+        for key in SCENE_KEYS:
+            if key in scene.keys():
+                del scene[key]
         return {'FINISHED'}
-    
-    #TODO: Check if any of the new variable need resetting here
\ No newline at end of file
+
+    #TODO: Check if any of the new variable need resetting here
@@ -14,10 +14,20 @@ class ScenePrep(bpy.types.Operator):
     bl_idname = 'object.scene_prep'
     bl_label = 'Plenoptic Video Scene Prep'
 
+    def sphere_points(self, scene, unit_vectors):
+        '''
+        Map unit vectors of shape [..., 3] onto the (scaled, rotated and translated) training sphere.
+        '''
+        points = scene.sphere_radius * np.array(scene.sphere_scale) * unit_vectors
+        overall_rotation = np.array(mathutils.Euler(scene.sphere_rotation).to_matrix()) # in case the sphere is rotated in the scene
+        return points @ overall_rotation.T + np.array(scene.sphere_location)
+
     def sample_cam_poses(self, scene, num_cameras, num_repetitions):
         ''' 
         Sample to distribute a number of cameras uniformly on the surface of a sphere.
         Although this function samples locations randomly, it is deterministic so that with the same scene seed it will always return the same result.
+        Every camera draws from its own stream (spawned from the scene seed), so adding cameras or frames does not move the existing ones.
+        Set 'Legacy Sampling' to reproduce the camera positions of datasets created before this sampler was introduced.
         Inputs:
         - scene: the scene object containing user settings (random seed and sphere details)
         - num_cameras: the number of cameras to distribute
@@ -26,9 +36,34 @@ class ScenePrep(bpy.types.Operator):
         Outputs:
         - points: a numpy array of shape (num_repititions, num_cameras, 3) containing the camera position coordinates (xyz)
         '''
+        if scene.legacy_cam_sampling:
+            return self.sample_cam_poses_legacy(scene, num_cameras, num_repetitions)
+
+        # one independent stream per camera, each draws a (theta, phi) pair per repetition
+        streams = np.random.SeedSequence(scene.seed).spawn(num_cameras)
+        samples = np.empty((num_repetitions, num_cameras, 2))
+        for num, stream in enumerate(streams):
+            samples[:, num, :] = np.random.default_rng(stream).random((num_repetitions, 2))
+
+        thetas = samples[..., 0] * 2 * np.pi
+        if scene.view_selection == 'mid-section':
+            cos_phis = 1 - 2 * (0.1 + 0.8 * samples[..., 1])
+        else:
+            cos_phis = 1 - 2 * samples[..., 1] # ensure uniform sampling from unit sphere
+        sin_phis = np.sqrt(1 - cos_phis ** 2)
+
+        unit_zs = np.abs(cos_phis) if scene.view_selection == 'upper' else cos_phis # if upper views is active, only distribute on the upper hemisphere
+        unit_vectors = np.stack((np.cos(thetas) * sin_phis, np.sin(thetas) * sin_phis, unit_zs), axis=-1)
+        return self.sphere_points(scene, unit_vectors) # numpy array of size [num_repetitions, num_cameras, 3] containing the camera position coordinates (xyz)
+
+    def sample_cam_poses_legacy(self, scene, num_cameras, num_repetitions):
+        '''
+        The original per-camera random.Random sampler, kept so that older datasets can be reproduced exactly.
+        '''
         # initialise random number generators
         seeds = [(2654435761 * (scene.seed + 1)) ^ (805459861 * (num + 1)) for num in range(num_cameras)]
         rngs = [random.Random(seed) for seed in seeds] # random number generators for each camera
+        overall_rotation = mathutils.Euler(scene.sphere_rotation).to_matrix() # in case the sphere is rotated in the scene
 
         # sample random angles
         cam_poses = []
@@ -48,7 +83,6 @@ class ScenePrep(bpy.types.Operator):
                 unit_zs = [np.cos(phi) for phi in phis]
             unit_vectors = np.vstack((unit_xs, unit_ys, unit_zs)).T
             points = scene.sphere_radius * np.array(scene.sphere_scale) * unit_vectors
-            overall_rotation = mathutils.Euler(scene.sphere_rotation).to_matrix() # in case the sphere is rotated in the scene
             points = (np.array(overall_rotation) @ points.T).T
             points = points + np.array(np.array(scene.sphere_location))
             cam_poses.append(points)
@@ -88,10 +122,6 @@ class ScenePrep(bpy.types.Operator):
         # set up multiview rendering
         scene = context.scene
         template_camera = scene.camera
-
-        scene.render.use_multiview = True # Activates multiview or "plenoptic" rendering option
-        scene.render.views_format = 'MULTIVIEW' # use multiview as opposed to stereo 3D 
-        default_cam_handles = ['left', 'right', 'RenderView'] # the first three cameras added to a multiview panel are always named this
         helper.create_sphere(context) # only creates the sphere if it does not already exist
 
         num_cameras = scene.nb_cameras
@@ -103,6 +133,13 @@ class ScenePrep(bpy.types.Operator):
         else:
             points = self.sample_cam_poses(scene, num_cameras, repetitions)
 
+        if scene.virtual_rig:
+            return self.prepare_rig(context, points), points
+
+        scene.render.use_multiview = True # Activates multiview or "plenoptic" rendering option
+        scene.render.views_format = 'MULTIVIEW' # use multiview as opposed to stereo 3D 
+        default_cam_handles = ['left', 'right', 'RenderView'] # the first three cameras added to a multiview panel are always named this
+
         cam_handle_record = [] # keep a record of pairs of object names and their corresponding camera handles for multi-view rendering
         bpy.ops.scene.render_view_add() # add a first additional camera in the multi-view menu
 
@@ -127,18 +164,43 @@ class ScenePrep(bpy.types.Operator):
 
             new_cam.name = f"{template_camera.name}_{i}"
             new_cam.data.name = f"{template_camera.name}_{i}"
+            helper.mark_owned(new_cam, new_cam.data)
             context.collection.objects.link(new_cam)
 
             if points.shape[0] > 1:
                 # if there are more than one repetition, keyframe the camera locations for each frame
-                for rep,coord in enumerate(points[:,i,:]):
-                    new_cam.location = coord
-                    new_cam.keyframe_insert(data_path='location', frame=scene.first_frame_nr + rep)
+                helper.keyframe_locations(new_cam, scene.first_frame_nr, points[:,i,:])
             
         bpy.data.objects.remove(bpy.data.objects[template_camera.name], do_unlink=True)
-        context.space_data.stereo_3d_camera = 'MONO'
+        if context.space_data is not None and context.space_data.type == 'VIEW_3D': # no 3D viewport when running headless
+            context.space_data.stereo_3d_camera = 'MONO'
         return cam_handle_record, points
 
+    def prepare_rig(self, context, points):
+        '''
+        Single camera "virtual rig": instead of one camera object and render view per camera, a single unconstrained copy of
+        the template camera is moved to every camera pose in turn while rendering (see RenderScene.render_rig).
+        The camera handles keep one entry per (virtual) camera, all pointing at the rig camera and without a render view.
+        '''
+        scene = context.scene
+        template_camera = scene.camera
+        scene.render.use_multiview = False # every view is rendered as a separate still image
+
+        rig_cam = template_camera.copy()
+        rig_cam.data = template_camera.data.copy()
+        rig_cam.animation_data_clear()
+        rig_cam.constraints.clear() # the pose is set directly from the pose table
+        rig_cam.location = points[0, 0]
+        rig_cam.name = f"{template_camera.name}_rig"
+        rig_cam.data.name = f"{template_camera.name}_rig"
+        helper.mark_owned(rig_cam, rig_cam.data)
+        context.collection.objects.link(rig_cam)
+
+        bpy.data.objects.remove(bpy.data.objects[template_camera.name], do_unlink=True)
+        scene.camera = rig_cam
+        scene['rig_camera'] = rig_cam.name
+        return [('', rig_cam.name) for _ in range(points.shape[1])]
+
     def execute(self, context):
 
         ''' First, check that all inputs are valid '''
@@ -165,7 +227,11 @@ class ScenePrep(bpy.types.Operator):
         '''
         #output_data = helper.get_camera_intrinsics(scene, template_camera)
         camera_list, poses = self.prepare_scene(context)
+        if scene.compositor_outputs:
+            helper.setup_compositor_outputs(scene) # masks and composites are written while rendering
         scene['cam_handles'] = camera_list # save the camera handles for later use
+        scene['cam_positions'] = poses.ravel().tolist() # cache the camera positions to compute the extrinsics without stepping through the frames
+        scene['cam_positions_shape'] = list(poses.shape)
 
         # clean directory name (unsupported characters replaced) and output path
         output_dir = bpy.path.clean_name(scene.dataset_name)
@@ -1,10 +1,59 @@
-import open3d as o3d
 import os
 import numpy as np
 import json
+import time
+import functools
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
 
-def train_test_split(dataset_path, test_cameras=[]):
+MANIFEST_NAME = '.postproc_manifest.json'
+
+class Manifest:
+    '''
+    Records, per processing step and output, the signatures (size and modification time) of the inputs and the parameters it was produced with,
+    so that re-runs can skip outputs that are already up to date and interrupted runs resume where they stopped.
+    Stored as .postproc_manifest.json in the dataset folder. Delete that file to force a full re-run.
+    '''
+
+    def __init__(self, dataset_path, save_interval=2.0):
+        self.path = os.path.join(dataset_path, MANIFEST_NAME)
+        self.save_interval = save_interval # seconds between intermediate saves while recording many outputs
+        self.entries = json.load(open(self.path)) if os.path.exists(self.path) else {}
+        self._last_save = time.monotonic()
+
+    @staticmethod
+    def signature(path):
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def up_to_date(self, step, key, inputs, params, outputs):
+        '''Whether the outputs exist and were produced from the same inputs and parameters.'''
+        entry = self.entries.get(step, {}).get(key)
+        if entry is None or entry['params'] != json.loads(json.dumps(params)):
+            return False
+        if not all(os.path.exists(output) for output in outputs):
+            return False
+        return all(os.path.exists(path) and entry['inputs'].get(path) == self.signature(path) for path in inputs)
+
+    def record(self, step, key, inputs, params):
+        self.entries.setdefault(step, {})[key] = {'inputs': {path: self.signature(path) for path in inputs}, 'params': json.loads(json.dumps(params))}
+        if time.monotonic() - self._last_save > self.save_interval:
+            self.save()
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path) # atomic, a crash never leaves a truncated manifest behind
+        self._last_save = time.monotonic()
+
+def train_test_split(dataset_path, test_cameras=[], manifest=None):
+
+    meta_path = os.path.join(dataset_path, 'meta.json')
+    outputs = [os.path.join(dataset_path, 'train_meta.json'), os.path.join(dataset_path, 'test_meta.json')]
+    if manifest is not None and manifest.up_to_date('split', 'meta', [meta_path], {'test_cameras': sorted(test_cameras)}, outputs):
+        return
 
     full_metadata = json.load(open(os.path.join(dataset_path, 'meta.json')))
     test_metadata = {}
@@ -38,6 +87,9 @@ def train_test_split(dataset_path, test_cameras=[]):
         json.dump(train_metadata, f, indent=4)
     with open(os.path.join(dataset_path, 'test_meta.json'), 'w') as f:
         json.dump(test_metadata, f, indent=4)
+    if manifest is not None:
+        manifest.record('split', 'meta', [meta_path], {'test_cameras': test_cameras})
+        manifest.save()
     return
 
 def remove_trailing_zeros(in_obj):
@@ -49,37 +101,254 @@ def remove_trailing_zeros(in_obj):
         return [remove_trailing_zeros(item) for item in in_obj]
     return in_obj
 
-def sample_dense_pc(dataset_path, first_frame=False, size=150000):
+PLY_DTYPES = {
+    'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8',
+}
+
+def read_ply_mesh(ply_path):
+    '''
+    Minimal NumPy reader for the triangulated (ASCII or binary) .ply files exported by the add-on.
+    Returns the vertices [N, 3], the vertex colours [N, 3] in [0, 1] (None if the file has no colours) and the triangles [T, 3].
+    '''
+    with open(ply_path, 'rb') as f:
+        elements = []
+        while True:
+            tokens = f.readline().decode('ascii').split()
+            if not tokens:
+                continue
+            if tokens[0] == 'format':
+                fmt = tokens[1]
+            elif tokens[0] == 'element':
+                elements.append((tokens[1], int(tokens[2]), []))
+            elif tokens[0] == 'property':
+                elements[-1][2].append((tokens[-1], tokens[1:-1]))
+            elif tokens[0] == 'end_header':
+                break
+        body = f.read()
+
+    (_, num_vertices, vertex_props), (_, num_faces, face_props) = elements[0], elements[1]
+    if fmt == 'ascii':
+        lines = body.decode('ascii').splitlines()
+        vertex_values = np.loadtxt(lines[:num_vertices], dtype=np.float64, ndmin=2)
+        vertex_data = {name: vertex_values[:, i] for i, (name, _) in enumerate(vertex_props)}
+        face_values = np.loadtxt(lines[num_vertices:num_vertices + num_faces], dtype=np.int64, ndmin=2) if num_faces else np.zeros((0, 4), np.int64)
+        counts, triangles = face_values[:, 0], face_values[:, 1:4]
+    else:
+        byte_order = '<' if fmt == 'binary_little_endian' else '>'
+        vertex_dtype = np.dtype([(name, byte_order + PLY_DTYPES[types[0]]) for name, types in vertex_props])
+        vertex_data = np.frombuffer(body, dtype=vertex_dtype, count=num_vertices)
+        _, count_type, index_type = face_props[0][1]
+        face_dtype = np.dtype([('count', byte_order + PLY_DTYPES[count_type]), ('indices', byte_order + PLY_DTYPES[index_type], 3)])
+        face_data = np.frombuffer(body, dtype=face_dtype, count=num_faces, offset=vertex_dtype.itemsize * num_vertices)
+        counts, triangles = face_data['count'], face_data['indices']
+    if np.any(counts != 3):
+        raise ValueError(f"{ply_path} is not triangulated")
+
+    vertices = np.stack([vertex_data['x'], vertex_data['y'], vertex_data['z']], axis=1).astype(np.float64)
+    colours = None
+    if all(name in dict(vertex_props) for name in ('red', 'green', 'blue')):
+        colours = np.stack([vertex_data['red'], vertex_data['green'], vertex_data['blue']], axis=1).astype(np.float64) / 255.0
+    return vertices, colours, np.asarray(triangles, dtype=np.int64)
+
+def write_point_cloud_ply(ply_path, points, colours):
+    '''Write a coloured point cloud (colours in [0, 1]) as a binary .ply file.'''
+    data = np.empty(len(points), dtype=[('x', '<f4'), ('y', '<f4'), ('z', '<f4'), ('red', 'u1'), ('green', 'u1'), ('blue', 'u1')])
+    for i, axis in enumerate('xyz'):
+        data[axis] = points[:, i]
+    for i, channel in enumerate(['red', 'green', 'blue']):
+        data[channel] = np.round(np.clip(colours[:, i], 0, 1) * 255)
+    header = f"ply\nformat binary_little_endian 1.0\nelement vertex {len(points)}\nproperty float x\nproperty float y\nproperty float z\nproperty uchar red\nproperty uchar green\nproperty uchar blue\nend_header\n"
+    with open(ply_path, 'wb') as f:
+        f.write(header.encode('ascii'))
+        f.write(data.tobytes())
+
+def sample_dense_pc(dataset_path, first_frame=False, size=150000, manifest=None, engine='numpy', seed=0):
     '''
     Sample a dense point cloud from .ply file 
     and save it as a .npz file. The array is saved in the format [x, y, z, r, g, b].
     The default size of 150,000 points is derived from the average size in the Dynamic 3D Gaussians dataset.
+    If a manifest is given, point clouds that are already up to date are not sampled again.
+    The default 'numpy' engine samples without Open3D (see sample_surface), engine='open3d' uses Open3D's sample_points_uniformly.
     '''
     standard_green = [0,102,17] # RGB values for a standard green colour in case there is no colour information in the point cloud
+    rng = np.random.default_rng(seed)
+    if engine == 'open3d':
+        import open3d as o3d # heavy, only imported when needed
     if first_frame:
-        mesh = o3d.io.read_triangle_mesh(os.path.join(dataset_path, 'points3d.ply'))
-        pc = mesh.sample_points_uniformly(number_of_points=size)
-        points = np.asarray(pc.points)
-        colours = np.asarray(pc.colors)
+        ply_path = os.path.join(dataset_path, 'points3d.ply')
+        outputs = [os.path.join(dataset_path, 'init_pt_cld.npz'), os.path.join(dataset_path, 'init_pt_cld.ply')]
+        if manifest is not None and manifest.up_to_date('init_pc', 'points3d', [ply_path], {'size': size, 'engine': engine, 'seed': seed}, outputs):
+            return
+        if engine == 'open3d':
+            mesh = o3d.io.read_triangle_mesh(ply_path)
+            pc = mesh.sample_points_uniformly(number_of_points=size)
+            points = np.asarray(pc.points)
+            colours = np.asarray(pc.colors)
+        else:
+            vertices, vertex_colours, triangles = read_ply_mesh(ply_path)
+            face_idx, bary = sample_surface(vertices, triangles, size, rng)
+            points = apply_surface_samples(vertices, triangles, face_idx, bary)
+            colours = np.zeros((0, 3)) if vertex_colours is None else apply_surface_samples(vertex_colours, triangles, face_idx, bary)
         if len(colours) == 0:
             colours = np.tile(np.asarray(standard_green), (size, 1)) / 255.0
-            pc.colors = o3d.utility.Vector3dVector(colours)
         nppc = np.append(points, colours, axis=1)
         nppc = np.append(nppc, np.ones([size,1]), axis=1) # Add a column of ones as segmentation mask
         out_file = os.path.join(dataset_path, 'init_pt_cld.npz')
         np.savez(out_file, data=nppc)
-        o3d.io.write_point_cloud(os.path.join(dataset_path, 'init_pt_cld.ply'), pc)
+        write_point_cloud_ply(os.path.join(dataset_path, 'init_pt_cld.ply'), points, colours)
+        if manifest is not None:
+            manifest.record('init_pc', 'points3d', [ply_path], {'size': size, 'engine': engine, 'seed': seed})
     else:
         ply_files = os.listdir(os.path.join(dataset_path, 'per_frame_plys'))
         for mesh in ply_files:
             ply_path = os.path.join(dataset_path, 'per_frame_plys', mesh)
             out_path = os.path.join(dataset_path, 'per_frame_pcs', mesh.replace('.ply', '.npz'))
             os.makedirs(os.path.join(dataset_path, 'per_frame_pcs'), exist_ok=True)
+            if manifest is not None and manifest.up_to_date('per_frame_pcs', mesh, [ply_path], {'size': size, 'engine': engine, 'seed': seed}, [out_path]):
+                continue
             
-            mesh = o3d.io.read_triangle_mesh(ply_path)
-            pc = mesh.sample_points_uniformly(number_of_points=size)
-            points = np.asarray(pc.points)
+            if engine == 'open3d':
+                pc = o3d.io.read_triangle_mesh(ply_path).sample_points_uniformly(number_of_points=size)
+                points = np.asarray(pc.points)
+            else:
+                vertices, _, triangles = read_ply_mesh(ply_path)
+                points = apply_surface_samples(vertices, triangles, *sample_surface(vertices, triangles, size, rng))
             np.savez(out_path, data=points)
+            if manifest is not None:
+                manifest.record('per_frame_pcs', mesh, [ply_path], {'size': size, 'engine': engine, 'seed': seed})
+    if manifest is not None:
+        manifest.save()
+    return
+
+def load_cached_mesh(dataset_path, frame, index=None, topology_cache=None):
+    '''
+    Load the merged mesh of all objects at one frame from the 'cached' per-frame mesh export (/per_frame_meshes/).
+    Returns vertices [N, 3], normals [N, 3] and triangles [T, 3] with indices into the merged vertex array.
+    Pass the same dict as topology_cache across calls to load each triangle list only once.
+    '''
+    mesh_dir = os.path.join(dataset_path, 'per_frame_meshes')
+    index = index or json.load(open(os.path.join(mesh_dir, 'index.json')))
+    topology_cache = {} if topology_cache is None else topology_cache
+    arrays = np.load(os.path.join(mesh_dir, f"frame_{frame:04d}.npz"))
+
+    vertices, normals, triangles = [], [], []
+    offset = 0
+    for obj_id, obj in enumerate(index['objects']):
+        if f"vertices_{obj_id}" not in arrays: # object not visible at this frame
+            continue
+        topology = [topology for topology in obj['topologies'] if topology['first_frame'] <= frame][-1]
+        if topology['file'] not in topology_cache:
+            topology_cache[topology['file']] = np.load(os.path.join(mesh_dir, topology['file']))
+        vertices.append(arrays[f"vertices_{obj_id}"])
+        normals.append(arrays[f"normals_{obj_id}"])
+        triangles.append(topology_cache[topology['file']] + offset)
+        offset += len(vertices[-1])
+    if not vertices:
+        return np.zeros((0, 3), np.float32), np.zeros((0, 3), np.float32), np.zeros((0, 3), np.int32)
+    return np.concatenate(vertices), np.concatenate(normals), np.concatenate(triangles)
+
+def sample_surface(vertices, triangles, size, rng):
+    '''
+    Area-weighted uniform sampling of points on a triangle mesh.
+    Returns the sampled face indices [size] and barycentric weights [size, 3], which can be re-applied to any
+    vertex array with the same topology via apply_surface_samples.
+    '''
+    corners = vertices[triangles]
+    areas = 0.5 * np.linalg.norm(np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]), axis=1)
+    cumulative = np.cumsum(areas, dtype=np.float64)
+    face_idx = np.searchsorted(cumulative, rng.random(size) * cumulative[-1], side='right')
+    face_idx = np.minimum(face_idx, len(triangles) - 1)
+
+    # uniform barycentric coordinates (square root parametrisation)
+    r1 = np.sqrt(rng.random(size))
+    r2 = rng.random(size)
+    bary = np.stack([1 - r1, r1 * (1 - r2), r1 * r2], axis=1)
+    return face_idx, bary
+
+def apply_surface_samples(vertices, triangles, face_idx, bary):
+    '''Positions of previously sampled surface points for the given vertex positions, in one gather.'''
+    return np.einsum('nk,nkd->nd', bary, vertices[triangles[face_idx]])
+
+def load_frame_mesh(source, dataset_path, frame, topology_cache=None):
+    '''Vertices and triangles of one frame, from the cached mesh export or from a per-frame .ply file.'''
+    if source == 'cached':
+        vertices, _, triangles = load_cached_mesh(dataset_path, frame, topology_cache=topology_cache)
+        return vertices.astype(np.float64), triangles
+    vertices, _, triangles = read_ply_mesh(os.path.join(dataset_path, 'per_frame_plys', frame))
+    return vertices, triangles
+
+# samples shared with the worker processes of sample_dense_pc_consistent, set once per process
+_shared_samples = {}
+
+def init_sample_worker(triangles, face_idx, bary, seed):
+    _shared_samples.update(triangles=triangles, face_idx=face_idx, bary=bary, seed=seed, topology_cache={})
+
+def sample_frame_pc(job):
+    '''
+    Worker for sample_dense_pc_consistent: applies the shared samples to one frame.
+    Frames whose topology differs from the first frame are sampled afresh, without correspondences.
+    Returns whether the shared samples could be used.
+    '''
+    source, dataset_path, frame, out_path = job
+    vertices, triangles = load_frame_mesh(source, dataset_path, frame, _shared_samples['topology_cache'])
+    consistent = np.array_equal(triangles, _shared_samples['triangles'])
+    if consistent:
+        points = apply_surface_samples(vertices, triangles, _shared_samples['face_idx'], _shared_samples['bary'])
+    else:
+        rng = np.random.default_rng([_shared_samples['seed'], zlib.crc32(os.path.basename(out_path).encode())]) # deterministic per frame
+        points = apply_surface_samples(vertices, triangles, *sample_surface(vertices, triangles, len(_shared_samples['face_idx']), rng))
+    np.savez(out_path, data=points)
+    return consistent
+
+def sample_dense_pc_consistent(dataset_path, size=300000, seed=0, workers=None, manifest=None):
+    '''
+    Temporally consistent alternative to sample_dense_pc(first_frame=False).
+    Surface samples (face indices and barycentric weights) are drawn once, area-weighted on the first frame, and re-applied
+    to the vertices of every other frame, so point i follows the same surface location over time.
+    Uses the cached mesh export (/per_frame_meshes/) if present, otherwise the per-frame .ply files.
+    Frames are processed in a pool of worker processes and written to /per_frame_pcs/ as they finish, in the same format as sample_dense_pc.
+    '''
+    if os.path.exists(os.path.join(dataset_path, 'per_frame_meshes', 'index.json')):
+        source = 'cached'
+        frames = json.load(open(os.path.join(dataset_path, 'per_frame_meshes', 'index.json')))['frames']
+        names = [f"frame_{frame:04d}" for frame in frames]
+        inputs = [os.path.join(dataset_path, 'per_frame_meshes', f"{name}.npz") for name in names]
+    else:
+        source = 'ply'
+        frames = sorted(name for name in os.listdir(os.path.join(dataset_path, 'per_frame_plys')) if name.endswith('.ply'))
+        names = [frame.replace('.ply', '') for frame in frames]
+        inputs = [os.path.join(dataset_path, 'per_frame_plys', frame) for frame in frames]
+    if not frames:
+        return
+    os.makedirs(os.path.join(dataset_path, 'per_frame_pcs'), exist_ok=True)
+    out_paths = [os.path.join(dataset_path, 'per_frame_pcs', f"{name}.npz") for name in names]
+
+    params = {'size': size, 'seed': seed, 'consistent': True}
+    jobs = [(source, dataset_path, frame, out_path) for frame, input_path, out_path in zip(frames, inputs, out_paths)
+            if manifest is None or not manifest.up_to_date('per_frame_pcs', os.path.basename(input_path), [input_path], params, [out_path])]
+    if not jobs:
+        return
+
+    # the samples always come from the first frame, so frames resumed later get the same correspondences
+    vertices, triangles = load_frame_mesh(source, dataset_path, frames[0])
+    face_idx, bary = sample_surface(vertices, triangles, size, np.random.default_rng(seed))
+
+    start = time.perf_counter()
+    inconsistent = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_sample_worker, initargs=(triangles, face_idx, bary, seed)) as pool:
+        for job, consistent in zip(jobs, pool.map(sample_frame_pc, jobs)):
+            inconsistent += not consistent
+            if manifest is not None:
+                input_path = inputs[frames.index(job[2])]
+                manifest.record('per_frame_pcs', os.path.basename(input_path), [input_path], params)
+    if manifest is not None:
+        manifest.save()
+    print(f"Sampled {len(jobs)} per-frame point clouds in {time.perf_counter() - start:.1f} s")
+    if inconsistent:
+        print(f"  {inconsistent} frames have a different topology than the first frame and were sampled without correspondences")
     return
 
 def create_segmentation_masks(dataset_path):
@@ -94,12 +363,10 @@ def create_segmentation_masks(dataset_path):
     def process_image(input_path, output_path):
         # Open the image
         img = Image.open(input_path).convert("RGBA")
-        # Extract the alpha channel (transparency)
-        alpha = img.split()[-1]
-        # Create a binary mask (255 for white, 0 for black)
-        binary_mask = Image.eval(alpha, lambda a: 255 if a > 0 else 0)
+        # Create a binary mask from the alpha channel (255 for white, 0 for black)
+        binary_mask = alpha_to_mask(np.asarray(img))
         # Save the mask
-        binary_mask.save(output_path)
+        Image.fromarray(binary_mask, mode="L").save(output_path)
 
     # Walk through the input directory and replicate the structure
     for root, _, files in os.walk(input_img_dir):
@@ -115,6 +382,28 @@ def create_segmentation_masks(dataset_path):
                 process_image(input_path, output_path)
 
 
+def alpha_to_mask(rgba):
+    '''Binary foreground mask (255 where alpha > 0, 0 elsewhere) of an RGBA array.'''
+    return np.where(rgba[..., 3] > 0, 255, 0).astype(np.uint8)
+
+def srgb_to_linear(c):
+    """Convert sRGB [0..1] to linear RGB."""
+    a = 0.055
+    c = np.clip(c, 0, 1)
+    linear = np.where(c <= 0.04045,
+                    c / 12.92,
+                    ((c + a) / (1 + a)) ** 2.4)
+    return linear
+
+def linear_to_srgb(c):
+    """Convert linear RGB [0..1] to sRGB."""
+    a = 0.055
+    c = np.clip(c, 0, 1)
+    srgb = np.where(c <= 0.0031308,
+                    c * 12.92,
+                    (1 + a) * (c ** (1 / 2.4)) - a)
+    return srgb
+
 def alpha_composite_linear(fg_img, bg_color=(0, 0, 0)):
     """
     Alpha composite an RGBA PIL image with straight alpha over a solid bg color.
@@ -126,24 +415,6 @@ def alpha_composite_linear(fg_img, bg_color=(0, 0, 0)):
     Returns:
         PIL Image in RGB mode with proper compositing done in linear space.
     """
-    def srgb_to_linear(c):
-        """Convert sRGB [0..1] to linear RGB."""
-        a = 0.055
-        c = np.clip(c, 0, 1)
-        linear = np.where(c <= 0.04045,
-                        c / 12.92,
-                        ((c + a) / (1 + a)) ** 2.4)
-        return linear
-
-    def linear_to_srgb(c):
-        """Convert linear RGB [0..1] to sRGB."""
-        a = 0.055
-        c = np.clip(c, 0, 1)
-        srgb = np.where(c <= 0.0031308,
-                        c * 12.92,
-                        (1 + a) * (c ** (1 / 2.4)) - a)
-        return srgb
-
     fg = np.array(fg_img).astype(np.float32) / 255.0
     alpha = fg[..., 3:4]  # shape (H,W,1)
     fg_rgb = fg[..., :3]
@@ -163,6 +434,46 @@ def alpha_composite_linear(fg_img, bg_color=(0, 0, 0)):
     comp_img = (comp_srgb * 255).round().astype(np.uint8)
     return Image.fromarray(comp_img, mode="RGB")
 
+@functools.lru_cache(maxsize=8)
+def composite_table(bg_color=(0, 0, 0)):
+    """
+    Lookup table of shape (256 alpha, 256 value, 3 channels) holding the 8-bit result of alpha_composite_linear
+    for every combination of alpha and channel value over the given background colour.
+    It is computed with alpha_composite_linear itself, so lookups are bit-identical to it.
+    """
+    alpha, value = np.meshgrid(np.arange(256, dtype=np.uint8), np.arange(256, dtype=np.uint8), indexing='ij')
+    grid = np.stack([value, value, value, alpha], axis=-1)
+    table = np.array(alpha_composite_linear(Image.fromarray(grid, mode="RGBA"), bg_color=bg_color))
+    table.setflags(write=False)
+    return table
+
+def alpha_composite_lut(fg_img, bg_color=(0, 0, 0), chunk_rows=256):
+    """
+    Faster drop-in for alpha_composite_linear based on precomputed tables, processed in row chunks to cap peak memory.
+
+    Args:
+        fg_img: PIL Image in RGBA mode, or an (H, W, 4) uint8 array (sRGB + straight alpha)
+        bg_color: tuple of 3 ints (0-255), background RGB in sRGB
+        chunk_rows: number of image rows processed at once
+
+    Returns:
+        PIL Image in RGB mode, bit-identical to alpha_composite_linear: every output value is a pure integer lookup into composite_table.
+        Only 8-bit images are supported, like everywhere else in this script (PIL reduces 16-bit RGBA PNGs to 8 bits when converting them to RGBA).
+    """
+    fg = np.asarray(fg_img)
+    if fg.dtype != np.uint8:
+        raise ValueError(f"alpha_composite_lut expects 8-bit RGBA images, got {fg.dtype}")
+    height = fg.shape[0]
+
+    table = composite_table(tuple(bg_color))
+    out = np.empty(fg.shape[:2] + (3,), dtype=np.uint8)
+    for row in range(0, height, chunk_rows):
+        chunk = fg[row:row + chunk_rows]
+        alpha = chunk[..., 3]
+        for channel in range(3):
+            out[row:row + chunk_rows, :, channel] = table[alpha, chunk[..., channel], channel]
+    return Image.fromarray(out, mode="RGB")
+
 def bg_composite(dataset_path, bg=(0,0,0)):
     '''
     Alpha-composites images from /alpha_ims/ with a solid background to '/ims/'
@@ -184,11 +495,89 @@ def bg_composite(dataset_path, bg=(0,0,0)):
                 os.makedirs(os.path.dirname(new_path), exist_ok=True)
 
                 im = Image.open(input_path).convert("RGBA")
-                comp = alpha_composite_linear(im, bg_color=bg)
+                comp = alpha_composite_lut(im, bg_color=bg)
                 comp.save(new_path)
     print(f"Alpha-composited images saved to {img_dir}.")
     return
 
+def logged_setting(dataset_path, name):
+    '''Whether an add-on setting was ticked for this data set, according to log.txt (False for older data sets without the entry).'''
+    log_path = os.path.join(dataset_path, 'log.txt')
+    if not os.path.exists(log_path):
+        return False
+    with open(log_path, 'r') as f:
+        return bool(json.load(f).get(name, False))
+
+def rendered_with_masks(dataset_path):
+    '''Whether the masks (seg/) and composites (ims/) were already written by the compositor while rendering ('Masks and Composites' in log.txt).'''
+    return logged_setting(dataset_path, 'Masks and Composites')
+
+def exported_init_point_cloud(dataset_path):
+    '''Whether init_pt_cld.npz was already written by the add-on at export time ('Dense Initial Point Cloud' in log.txt).'''
+    return logged_setting(dataset_path, 'Dense Initial Point Cloud')
+
+def process_alpha_image(job):
+    '''
+    Worker for segment_and_composite: decodes one RGBA image once and writes both its mask and its composite.
+    Returns the time spent in each stage.
+    '''
+    input_path, mask_path, comp_path, bg = job
+    t0 = time.perf_counter()
+    img = Image.open(input_path).convert("RGBA")
+    img.load()
+    t1 = time.perf_counter()
+    Image.fromarray(alpha_to_mask(np.asarray(img)), mode="L").save(mask_path)
+    t2 = time.perf_counter()
+    alpha_composite_lut(img, bg_color=bg).save(comp_path)
+    t3 = time.perf_counter()
+    return t1 - t0, t2 - t1, t3 - t2
+
+def segment_and_composite(dataset_path, bg=(0,0,0), workers=None, manifest=None):
+    '''
+    Fused, parallel replacement for create_segmentation_masks followed by bg_composite.
+    Every image in /alpha_ims/ is decoded once, and both its mask in /seg/ and its composite in /ims/ are written from the same buffer.
+    Files are spread across a pool of worker processes (default: one per CPU core).
+    If a manifest is given, images whose outputs are already up to date are skipped and progress is recorded as files complete.
+    '''
+    alpha_dir = os.path.join(dataset_path, 'alpha_ims/')
+    mask_dir = os.path.join(dataset_path, 'seg/')
+    img_dir = os.path.join(dataset_path, 'ims/')
+
+    jobs = []
+    for root, _, files in os.walk(alpha_dir):
+        for filename in files:
+            if filename.endswith(".png"):
+                input_path = os.path.join(root, filename)
+                relative_path = os.path.relpath(input_path, alpha_dir)
+                mask_path = os.path.join(mask_dir, relative_path)
+                comp_path = os.path.join(img_dir, relative_path)
+                if manifest is not None and manifest.up_to_date('images', relative_path, [input_path], {'bg': list(bg)}, [mask_path, comp_path]):
+                    continue
+                os.makedirs(os.path.dirname(mask_path), exist_ok=True)
+                os.makedirs(os.path.dirname(comp_path), exist_ok=True)
+                jobs.append((input_path, mask_path, comp_path, tuple(bg)))
+    if not jobs:
+        return
+
+    start = time.perf_counter()
+    timings = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(process_alpha_image, jobs, chunksize=max(1, min(64, len(jobs) // (4 * (workers or os.cpu_count() or 1)))))
+        for job, timing in zip(jobs, results):
+            timings.append(timing)
+            if manifest is not None:
+                manifest.record('images', os.path.relpath(job[0], alpha_dir), [job[0]], {'bg': list(bg)})
+    if manifest is not None:
+        manifest.save()
+    timings = np.array(timings)
+    elapsed = time.perf_counter() - start
+
+    print(f"Processed {len(jobs)} images in {elapsed:.1f} s ({len(jobs) / elapsed:.1f} images/s overall)")
+    for name, total in zip(['decode', 'mask', 'composite'], timings.sum(axis=0)):
+        print(f"  {name}: {total / len(jobs) * 1000:.1f} ms/image ({len(jobs) / total:.1f} images/s per worker)")
+    print(f"Segmentation masks saved to {mask_dir}, alpha-composited images saved to {img_dir}.")
+    return
+
 if __name__ == '__main__':
 
     ## ------------------------------------------------------------------  
@@ -197,23 +586,28 @@ if __name__ == '__main__':
     folder = '/home/kh790/Desktop/synthetic_blender_data/rendered_no_floors/'
     point_cloud_size = 150000
     test_cameras = [3,9,20,31]
+    workers = None # number of worker processes for the image passes, None uses all CPU cores
     ##-----------------------------------------------------------------
 
     for item in os.listdir(folder):
 
         scene_path = os.path.join(folder, item.split('.')[0])
+        manifest = Manifest(scene_path) # keeps track of finished outputs so that re-runs only process what changed
         
-        '''1) Use this function to produce crude foreground/background segmentation masks for all images, if your images have an Alpha Channel (RGBA)'''
-        create_segmentation_masks(scene_path)
+        '''1) Use this function to produce crude foreground/background segmentation masks for all images, if your images have an Alpha Channel (RGBA),
+        and to composite the RGBA images with a solid background colour in the same pass.
+        (create_segmentation_masks and bg_composite do the same separately, on a single core)'''
+        if not rendered_with_masks(scene_path):
+            segment_and_composite(scene_path, bg=(0,0,0), workers=workers, manifest=manifest)
 
         '''2) Use this function to split the data set into training and testing sets. Specify the ID numbers of the cameras you want to use for testing.'''
-        train_test_split(scene_path, test_cameras=test_cameras)
+        train_test_split(scene_path, test_cameras=test_cameras, manifest=manifest)
         
-        '''3) Use this function to sample a dense point cloud from the sparse point cloud Blender outputs (first frame of your animation)'''
-        sample_dense_pc(scene_path, first_frame=True, size=point_cloud_size)
-
-        '''4) Use this function to composite the RGBA images with a solid background colour.'''
-        bg_composite(scene_path, bg=(0,0,0))
-
-        '''5) Use this function to sample dense point clouds from per-frame ply files'''
-        sample_dense_pc(scene_path, first_frame=False, size=300000)
\ No newline at end of file
+        '''3) Use this function to sample a dense point cloud from the sparse point cloud Blender outputs (first frame of your animation).
+        Skipped if the add-on already wrote init_pt_cld.npz ('Dense Initial Point Cloud') or did not export points3d.ply ('Gaussian Points' off)'''
+        if not exported_init_point_cloud(scene_path) and os.path.exists(os.path.join(scene_path, 'points3d.ply')):
+            sample_dense_pc(scene_path, first_frame=True, size=point_cloud_size, manifest=manifest)
+
+        '''4) Use this function to sample dense point clouds from the per-frame meshes, with point correspondences across frames
+        (sample_dense_pc with first_frame=False samples each frame independently instead)'''
+        sample_dense_pc_consistent(scene_path, size=300000, workers=workers, manifest=manifest)
\ No newline at end of file
@@ -0,0 +1,68 @@
+import json
+import os
+import numpy as np
+
+'''
+Lazy reader for the binary metadata written next to meta.json when 'Binary Metadata' is enabled in the add-on.
+The arrays are memory-mapped, so only the slices that are actually accessed are read from disk.
+If a dataset has no binary metadata, meta.json is parsed once as a fallback and the same interface is offered.
+'''
+
+class MetaReader:
+
+    def __init__(self, dataset_path, meta_dir='meta'):
+        binary_path = os.path.join(dataset_path, meta_dir)
+        if os.path.exists(os.path.join(binary_path, 'index.json')):
+            index = json.load(open(os.path.join(binary_path, 'index.json')))
+            self._w2c = np.load(os.path.join(binary_path, 'w2c.npy'), mmap_mode='r')
+            self.k = np.load(os.path.join(binary_path, 'k.npy'))
+            self.file_extension = index['file_extension']
+            self.w = index['w']
+            self.h = index['h']
+        else:
+            metadata = json.load(open(os.path.join(dataset_path, 'meta.json')))
+            self._w2c = np.asarray(metadata['w2c'])
+            self.k = np.asarray(metadata['k'])[0, 0]
+            self.file_extension = metadata['fn'][0][0].split('.')[-1]
+            self.w = metadata['w']
+            self.h = metadata['h']
+        self.num_frames, self.num_cameras = self._w2c.shape[:2]
+
+    def w2c(self, frame=None, cam_id=None):
+        '''
+        Returns the w2c matrices of one frame [num_cameras, 4, 4], one camera [num_frames, 4, 4], a single image [4, 4] or everything.
+        '''
+        frames = slice(None) if frame is None else frame
+        cameras = slice(None) if cam_id is None else cam_id
+        return np.asarray(self._w2c[frames, cameras])
+
+    def fn(self, frame, cam_id):
+        '''File name of an image relative to the image folder, identical to the entries of meta.json's 'fn' array.'''
+        return f"{cam_id}/{str(frame + 1).zfill(6)}.{self.file_extension}"
+
+    def frame(self, frame):
+        '''All metadata of one frame, laid out like a single row of meta.json.'''
+        return {
+            'k': np.tile(self.k, (self.num_cameras, 1, 1)),
+            'w2c': self.w2c(frame=frame),
+            'fn': [self.fn(frame, cam_id) for cam_id in range(self.num_cameras)],
+            'cam_id': list(range(self.num_cameras)),
+        }
+
+    def camera(self, cam_id):
+        '''All metadata of one camera across the whole sequence.'''
+        return {
+            'k': np.tile(self.k, (self.num_frames, 1, 1)),
+            'w2c': self.w2c(cam_id=cam_id),
+            'fn': [self.fn(frame, cam_id) for frame in range(self.num_frames)],
+            'cam_id': cam_id,
+        }
+
+
+if __name__ == '__main__':
+
+    dataset_path = '/home/kh790/Desktop/synthetic_blender_data/rendered_no_floors/dataset'
+    meta = MetaReader(dataset_path)
+    print(f"{meta.num_frames} frames, {meta.num_cameras} cameras, {meta.w}x{meta.h} px")
+    print(meta.frame(0)['fn'][:3])
+    print(meta.w2c(frame=0, cam_id=0))
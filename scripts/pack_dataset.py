@@ -0,0 +1,223 @@
+import os
+import io
+import json
+import tarfile
+import threading
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+
+'''
+Packs the images of a rendered data set (ims/<cam>/<frame>.png, or seg/ and alpha_ims/) into a few large shards,
+so that training data loaders open a handful of files instead of one file per (frame, camera).
+Two shard formats are available:
+- 'memmap': decoded uint8 pixels in .npy files of shape [images, h, w, channels], memory-mapped on read (no PNG decoding while training)
+- 'tar': the original PNG files in plain tar archives, with the byte offset of every image stored in the index (no tarfile parsing on read)
+Shards hold either one camera each ('camera') or all cameras of a chunk of frames ('frames').
+Images are addressed by the same (frame, cam_id) keys as the rows and columns of meta.json's 'fn' array.
+The shards and index.json are written to <dataset>/packed/<image folder>/, and unpack_dataset restores the original layout.
+'''
+
+INDEX_NAME = 'index.json'
+
+def image_keys(dataset_path):
+    '''Table of image file names [frames][cameras] from meta.json, relative to the image folder.'''
+    return json.load(open(os.path.join(dataset_path, 'meta.json')))['fn']
+
+def shard_groups(num_frames, num_cameras, group='camera', frames_per_shard=50):
+    '''Lists the (frame, cam_id) keys of every shard, in storage order.'''
+    if group == 'camera':
+        return [[(frame, cam_id) for frame in range(num_frames)] for cam_id in range(num_cameras)]
+    if group == 'frames':
+        return [[(frame, cam_id) for frame in range(start, min(start + frames_per_shard, num_frames)) for cam_id in range(num_cameras)]
+                for start in range(0, num_frames, frames_per_shard)]
+    raise ValueError(f"Unknown shard group '{group}', expected 'camera' or 'frames'")
+
+def pack_memmap_shard(job):
+    '''
+    Worker for pack_dataset: decodes the images of one shard into a new .npy file.
+    Returns the shard's index entries {fn: [shard, position]}.
+    '''
+    shard_id, shard_path, paths, names, shape, mode = job
+    tmp_path = shard_path + '.tmp.npy'
+    pixels = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint8, shape=(len(paths),) + tuple(shape))
+    for position, path in enumerate(paths):
+        img = np.asarray(Image.open(path).convert(mode))
+        if img.shape != tuple(shape):
+            raise ValueError(f"{path} has shape {img.shape}, but the memmap format needs all images to have shape {tuple(shape)}")
+        pixels[position] = img
+    pixels.flush()
+    del pixels
+    os.replace(tmp_path, shard_path)
+    return {name: [shard_id, position] for position, name in enumerate(names)}
+
+def pack_tar_shard(job):
+    '''
+    Worker for pack_dataset: copies the image files of one shard into a new tar archive.
+    Returns the shard's index entries {fn: [shard, byte offset, byte size]}.
+    '''
+    shard_id, shard_path, paths, names = job
+    tmp_path = shard_path + '.tmp'
+    with tarfile.open(tmp_path, 'w', format=tarfile.GNU_FORMAT) as tar:
+        for path, name in zip(paths, names):
+            tar.add(path, arcname=name, recursive=False)
+    with tarfile.open(tmp_path, 'r') as tar: # data offsets are only known once the headers are written, reading them back skips the file contents
+        entries = {member.name: [shard_id, member.offset_data, member.size] for member in tar.getmembers()}
+    os.replace(tmp_path, shard_path)
+    return entries
+
+def pack_dataset(dataset_path, image_dir='ims', shard_format='memmap', group='camera', frames_per_shard=50, workers=None):
+    '''
+    Packs <dataset>/<image_dir>/ into shards in <dataset>/packed/<image_dir>/ (see the module description for the formats).
+    The memmap format needs all images to have the same size; the number of channels is taken from the first image.
+    Shards are packed in parallel, one shard per worker process. Every packing writes its shards under new names (with a generation number)
+    and replaces index.json only once all of them are complete, so an interrupted re-pack leaves the previous packing intact and readable.
+    Shards of earlier packings are deleted after the new index is in place.
+    '''
+    if shard_format not in ('memmap', 'tar'):
+        raise ValueError(f"Unknown shard format '{shard_format}', expected 'memmap' or 'tar'")
+    keys = image_keys(dataset_path)
+    num_frames, num_cameras = len(keys), len(keys[0])
+    input_dir = os.path.join(dataset_path, image_dir)
+    output_dir = os.path.join(dataset_path, 'packed', image_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    index_path = os.path.join(output_dir, INDEX_NAME)
+    generation = json.load(open(index_path)).get('generation', 0) + 1 if os.path.exists(index_path) else 0
+
+    groups = shard_groups(num_frames, num_cameras, group, frames_per_shard)
+    extension = 'npy' if shard_format == 'memmap' else 'tar'
+    shards = [f"{'cam' if group == 'camera' else 'frames'}_{str(shard_id).zfill(4)}.g{generation}.{extension}" for shard_id in range(len(groups))]
+    index = {'format': shard_format, 'group': group, 'image_dir': image_dir, 'num_frames': num_frames, 'num_cameras': num_cameras, 'generation': generation, 'shards': shards}
+
+    jobs = []
+    for shard_id, shard_keys in enumerate(groups):
+        names = [keys[frame][cam_id] for frame, cam_id in shard_keys]
+        paths = [os.path.join(input_dir, name) for name in names]
+        jobs.append((shard_id, os.path.join(output_dir, shards[shard_id]), paths, names))
+
+    if shard_format == 'memmap':
+        first = Image.open(jobs[0][2][0])
+        mode = {'1': 'L', 'P': 'RGBA', 'LA': 'RGBA'}.get(first.mode, first.mode) # modes without a plain uint8 layout
+        shape = np.asarray(first.convert(mode)).shape
+        index.update({'shape': list(shape), 'dtype': 'uint8', 'mode': mode, 'file_extension': jobs[0][3][0].split('.')[-1]})
+        jobs = [job + (shape, mode) for job in jobs]
+        pack_shard = pack_memmap_shard
+    else:
+        pack_shard = pack_tar_shard
+
+    entries = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for shard_entries in pool.map(pack_shard, jobs):
+            entries.update(shard_entries)
+    # (frame, cam_id) -> location, in the same layout as meta.json's 'fn' array
+    index['entries'] = [[entries[keys[frame][cam_id]] for cam_id in range(num_cameras)] for frame in range(num_frames)]
+    index['fn'] = keys
+
+    tmp_path = index_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, index_path)
+    for filename in set(os.listdir(output_dir)) - set(shards) - {INDEX_NAME}: # earlier packings and leftovers of interrupted ones
+        os.remove(os.path.join(output_dir, filename))
+    print(f"Packed {num_frames * num_cameras} images from {input_dir} into {len(shards)} {shard_format} shards in {output_dir}")
+
+class PackedImages:
+    '''
+    Reader for the shards written by pack_dataset. Images are read by their meta.json keys, e.g. images[frame, cam_id].
+    memmap shards return read-only views into the memory-mapped file, tar shards return the decoded PNG (or the raw bytes with read_bytes).
+    Safe to use from several threads.
+    '''
+
+    def __init__(self, dataset_path, image_dir='ims'):
+        self.path = os.path.join(dataset_path, 'packed', image_dir)
+        index = json.load(open(os.path.join(self.path, INDEX_NAME)))
+        self.format = index['format']
+        self.group = index['group']
+        self.num_frames = index['num_frames']
+        self.num_cameras = index['num_cameras']
+        self.shards = index['shards']
+        self.entries = index['entries']
+        self.keys = index['fn']
+        self.shape = tuple(index['shape']) if 'shape' in index else None
+        self._open = {} # shard id -> memory map or file handle, opened on first access
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.num_frames * self.num_cameras
+
+    def fn(self, frame, cam_id):
+        '''File name of an image relative to the image folder, identical to the entries of meta.json's 'fn' array.'''
+        return self.keys[frame][cam_id]
+
+    def _shard(self, shard_id):
+        if shard_id not in self._open:
+            with self._lock:
+                if shard_id not in self._open:
+                    shard_path = os.path.join(self.path, self.shards[shard_id])
+                    if self.format == 'memmap':
+                        self._open[shard_id] = np.load(shard_path, mmap_mode='r')
+                    else:
+                        self._open[shard_id] = open(shard_path, 'rb', buffering=0)
+        return self._open[shard_id]
+
+    def read_bytes(self, frame, cam_id):
+        '''The original encoded image file (tar shards only).'''
+        if self.format != 'tar':
+            raise ValueError("read_bytes needs tar shards, memmap shards only store the decoded pixels")
+        shard_id, offset, size = self.entries[frame][cam_id]
+        handle = self._shard(shard_id)
+        if hasattr(os, 'pread'):
+            return os.pread(handle.fileno(), size, offset)
+        with self._lock: # no positional reads on this platform, seek and read must not interleave
+            handle.seek(offset)
+            return handle.read(size)
+
+    def __getitem__(self, key):
+        '''Pixels of one image as a uint8 array [h, w, channels] (or [h, w] for grayscale).'''
+        frame, cam_id = key
+        if self.format == 'memmap':
+            shard_id, position = self.entries[frame][cam_id]
+            return self._shard(shard_id)[position]
+        return np.asarray(Image.open(io.BytesIO(self.read_bytes(frame, cam_id))))
+
+    def close(self):
+        for shard in self._open.values():
+            if self.format == 'tar':
+                shard.close()
+        self._open = {}
+
+def unpack_dataset(dataset_path, image_dir='ims', output_dir=None):
+    '''
+    Writes the packed images back into the original <image_dir>/<cam>/<frame>.png layout (or into output_dir).
+    tar shards restore the original files byte for byte, memmap shards are re-encoded with the same pixels.
+    '''
+    images = PackedImages(dataset_path, image_dir)
+    output_dir = os.path.join(dataset_path, image_dir) if output_dir is None else output_dir
+    for frame in range(images.num_frames):
+        for cam_id in range(images.num_cameras):
+            output_path = os.path.join(output_dir, images.fn(frame, cam_id))
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            if images.format == 'tar':
+                with open(output_path, 'wb') as f:
+                    f.write(images.read_bytes(frame, cam_id))
+            else:
+                Image.fromarray(np.asarray(images[frame, cam_id])).save(output_path)
+    images.close()
+    print(f"Unpacked {len(images)} images to {output_dir}")
+
+
+if __name__ == '__main__':
+
+    ## ------------------------------------------------------------------
+    ''' USER INPUTS '''
+    dataset_path = '/home/kh790/Desktop/synthetic_blender_data/rendered_no_floors/dataset'
+    image_dirs = ['ims', 'seg'] # image folders to pack, each gets its own shards in packed/<folder>/
+    shard_format = 'memmap' # 'memmap' (decoded pixels, fastest to read) or 'tar' (original PNG files, smallest)
+    group = 'camera' # 'camera' (one shard per camera) or 'frames' (all cameras of frames_per_shard frames per shard)
+    frames_per_shard = 50
+    workers = None # number of worker processes, None uses all CPU cores
+    ##-----------------------------------------------------------------
+
+    for image_dir in image_dirs:
+        if os.path.isdir(os.path.join(dataset_path, image_dir)):
+            pack_dataset(dataset_path, image_dir=image_dir, shard_format=shard_format, group=group, frames_per_shard=frames_per_shard, workers=workers)
@@ -0,0 +1,248 @@
+import os
+import json
+import time
+import threading
+import collections
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+from meta_reader import MetaReader
+from pack_dataset import PackedImages, INDEX_NAME
+
+'''
+Random access reader for the data sets written by the add-on (and the post-processing script).
+Metadata is loaded once into arrays, so looking up an image by (frame, cam_id) is a plain index.
+Decoded images are kept in a size-bounded LRU cache, and iterate() decodes ahead of the consumer on a thread pool.
+Images are read from packed/<folder>/ when pack_dataset.py has been run, otherwise from the PNG files.
+'''
+
+ORDERS = ('frame', 'camera', 'shuffle')
+
+class LRUCache:
+    '''Thread-safe least recently used cache of arrays, bounded by their total size in bytes.'''
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        if value.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self.bytes -= self._items.pop(key).nbytes
+            self._items[key] = value
+            self.bytes += value.nbytes
+            while self.bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.bytes -= evicted.nbytes
+
+    def __len__(self):
+        return len(self._items)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+class PlenoDataset:
+    '''
+    Reader over meta.json (split=None), train_meta.json (split='train') or test_meta.json (split='test'), the image folders ims/ and seg/ and init_pt_cld.npz.
+    Images are addressed by frame index and camera number, as in the 'cam_id' array of the metadata, e.g. dataset[frame, cam_id].
+    cache_mb bounds the memory used by decoded images, workers is the number of decoding threads used by iterate().
+    '''
+
+    def __init__(self, dataset_path, split=None, cache_mb=1024, workers=4, use_packed=True):
+        self.path = dataset_path
+        if split is None:
+            meta = MetaReader(dataset_path) # memory-maps the binary metadata if the data set has it
+            self.w2c = meta.w2c()
+            self.k = meta.k
+            self.fn = [[meta.fn(frame, cam_id) for cam_id in range(meta.num_cameras)] for frame in range(meta.num_frames)]
+            self.cam_ids = list(range(meta.num_cameras))
+            self.w, self.h = meta.w, meta.h
+        else:
+            metadata = json.load(open(os.path.join(dataset_path, f"{split}_meta.json")))
+            self.w2c = np.asarray(metadata['w2c'], dtype=np.float32)
+            self.k = np.asarray(metadata['k'], dtype=np.float32)[0, 0] # all cameras share the same intrinsics
+            self.fn = metadata['fn']
+            self.cam_ids = list(metadata['cam_id'][0])
+            self.w, self.h = metadata['w'], metadata['h']
+        self.num_frames = len(self.fn)
+        self._column = {cam_id: column for column, cam_id in enumerate(self.cam_ids)} # cam_id -> column of the metadata arrays
+
+        self._packed = {}
+        for folder in ('ims', 'seg'):
+            if use_packed and os.path.exists(os.path.join(dataset_path, 'packed', folder, INDEX_NAME)):
+                self._packed[folder] = PackedImages(dataset_path, folder)
+        self.has_masks = 'seg' in self._packed or os.path.isdir(os.path.join(dataset_path, 'seg'))
+        self._point_cloud = None
+
+        self.cache = LRUCache(cache_mb * 1024 * 1024)
+        self.workers = workers
+        self._pending = {} # key -> event set once an image that is being decoded is cached, so that it is never decoded twice at the same time
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def __len__(self):
+        return self.num_frames * len(self.cam_ids)
+
+    def keys(self, order='frame', seed=0):
+        '''
+        All (frame, cam_id) pairs in the given access order:
+        'frame' (all cameras of a frame, frame by frame), 'camera' (all frames of a camera, camera by camera) or 'shuffle' (random, reproducible with seed).
+        '''
+        if order not in ORDERS:
+            raise ValueError(f"Unknown access order '{order}', expected one of {ORDERS}")
+        if order == 'camera':
+            return [(frame, cam_id) for cam_id in self.cam_ids for frame in range(self.num_frames)]
+        keys = [(frame, cam_id) for frame in range(self.num_frames) for cam_id in self.cam_ids]
+        if order == 'shuffle':
+            keys = [keys[i] for i in np.random.default_rng(seed).permutation(len(keys))]
+        return keys
+
+    def _decode(self, folder, frame, cam_id):
+        start = time.perf_counter()
+        if folder in self._packed:
+            img = np.asarray(self._packed[folder][frame, cam_id])
+        else:
+            img = np.asarray(Image.open(os.path.join(self.path, folder, self.fn[frame][self._column[cam_id]])))
+        with self._lock:
+            self._stats['decoded'] += 1
+            self._stats['decode_seconds'] += time.perf_counter() - start
+        return img
+
+    def _load(self, folder, frame, cam_id, prefetch=False):
+        '''Returns the cached image, or decodes and caches it. Waits for a decode already in flight instead of repeating it.'''
+        key = (folder, frame, cam_id)
+        img = self.cache.get(key)
+        if img is not None:
+            with self._lock:
+                self._stats['prefetch_hits' if prefetch else 'hits'] += 1
+            return img
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = threading.Event()
+                owner = True
+            else:
+                owner = False
+            self._stats['prefetch_misses' if prefetch else 'misses'] += 1
+        if not owner:
+            pending.wait()
+            img = self.cache.get(key)
+            return img if img is not None else self._decode(folder, frame, cam_id) # evicted straight away, e.g. by a very small cache
+        try:
+            img = self._decode(folder, frame, cam_id)
+            self.cache.put(key, img)
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.set()
+        return img
+
+    def image(self, frame, cam_id):
+        '''Decoded image from ims/ as a uint8 array [h, w, channels].'''
+        return self._load('ims', frame, cam_id)
+
+    def mask(self, frame, cam_id):
+        '''Decoded segmentation mask from seg/ as a uint8 array [h, w] (0 background, 255 foreground).'''
+        return self._load('seg', frame, cam_id)
+
+    def point_cloud(self):
+        '''The dense initial point cloud from init_pt_cld.npz, [points, 7] (position, colour, segmentation), loaded on first access.'''
+        if self._point_cloud is None:
+            self._point_cloud = np.load(os.path.join(self.path, 'init_pt_cld.npz'))['data']
+        return self._point_cloud
+
+    def __getitem__(self, key):
+        '''All data of one image: pixels, mask (if the data set has masks), camera matrices and file name.'''
+        frame, cam_id = key
+        column = self._column[cam_id]
+        item = {
+            'frame': frame,
+            'cam_id': cam_id,
+            'fn': self.fn[frame][column],
+            'k': self.k,
+            'w2c': np.asarray(self.w2c[frame, column]),
+            'im': self.image(frame, cam_id),
+        }
+        if self.has_masks:
+            item['seg'] = self.mask(frame, cam_id)
+        return item
+
+    def iterate(self, order='frame', keys=None, ahead=None, seed=0):
+        '''
+        Yields dataset[frame, cam_id] for all images in the given access order (see keys()) or for the given list of keys,
+        while a thread pool decodes up to `ahead` images (default: 4 per worker) ahead of the consumer into the cache.
+        The cache should hold at least `ahead` images, otherwise prefetched images are evicted before they are used.
+        '''
+        keys = self.keys(order, seed) if keys is None else list(keys)
+        ahead = 4 * self.workers if ahead is None else ahead
+        folders = ('ims', 'seg') if self.has_masks else ('ims',)
+
+        def prefetch(key):
+            for folder in folders:
+                self._load(folder, *key, prefetch=True)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            in_flight = collections.deque()
+            submitted = 0
+            try:
+                for key in keys:
+                    while submitted < len(keys) and len(in_flight) < ahead:
+                        in_flight.append(pool.submit(prefetch, keys[submitted]))
+                        submitted += 1
+                    in_flight.popleft().result() # re-raises decoding errors in the consumer
+                    yield self[key]
+                    with self._lock:
+                        self._stats['served'] += 1
+                        self._stats['serve_seconds'] = time.perf_counter() - start
+            finally:
+                for future in in_flight: # the consumer stopped early
+                    future.cancel()
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats = {'hits': 0, 'misses': 0, 'prefetch_hits': 0, 'prefetch_misses': 0, 'decoded': 0, 'decode_seconds': 0.0, 'served': 0, 'serve_seconds': 0.0}
+
+    def stats(self):
+        '''
+        Cache and throughput statistics since the last reset_stats():
+        hit_rate is the share of images the consumer found already decoded (in the cache), throughput the images per second served by iterate().
+        '''
+        with self._lock:
+            stats = dict(self._stats)
+        requests = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / requests if requests else 0.0
+        stats['throughput'] = stats['served'] / stats['serve_seconds'] if stats['serve_seconds'] else 0.0
+        stats['decode_ms'] = 1000 * stats['decode_seconds'] / stats['decoded'] if stats['decoded'] else 0.0
+        stats['cache_mb'] = self.cache.bytes / (1024 * 1024)
+        stats['cached_images'] = len(self.cache)
+        return stats
+
+    def close(self):
+        for packed in self._packed.values():
+            packed.close()
+        self.cache.clear()
+
+
+if __name__ == '__main__':
+
+    dataset_path = '/home/kh790/Desktop/synthetic_blender_data/rendered_no_floors/dataset'
+    dataset = PlenoDataset(dataset_path, split='train', cache_mb=2048, workers=8)
+    print(f"{dataset.num_frames} frames, {len(dataset.cam_ids)} cameras, {dataset.w}x{dataset.h} px")
+    for item in dataset.iterate(order='shuffle'):
+        pass
+    print(dataset.stats())